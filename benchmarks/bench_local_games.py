@@ -0,0 +1,71 @@
+"""Time and memory of parsing the configuration file into the games collection a batch at a time,
+the way the plugin parses batches in the local io pool and merges them on the event loop, per library size.
+Parsing leaves cyclic garbage behind which only the garbage collector frees, so the transient peak depends on
+when collections happen and grows with the library, it is a few megabytes for thousands of games."""
+import gc
+import json
+import time
+import tracemalloc
+
+from synthetic import generate_configuration
+from local import LocalParser
+from games_collection import GamesCollection
+
+
+def _measure(configuration):
+    # imports and caches filled by the first parse are not part of what a parse costs
+    list(LocalParser().parse_games(configuration))
+    gc.collect()
+    collection = GamesCollection()
+    tracemalloc.start()
+    start = time.perf_counter()
+    games = LocalParser().parse_games(configuration)
+    for batch in iter(lambda: LocalParser.next_batch(games), []):
+        for game in collection.merge(batch):
+            game.as_local_game()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return collection, elapsed, retained, peak
+
+
+def _time_batch(configuration, repeat):
+    """Parsing the whole file up front and appending it at once, as get_owned_games did before streaming"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        games = list(LocalParser().parse_games(configuration))
+        parsed = time.perf_counter()
+        GamesCollection().append(games)
+        appended = time.perf_counter()
+        if best is None or appended - start < best[0] + best[1]:
+            best = (parsed - start, appended - parsed)
+    return best
+
+
+def run(sizes=(10, 100, 1000, 3000), repeat=3):
+    results = []
+    for size in sizes:
+        configuration, launch_ids = generate_configuration(size)
+        collection, elapsed, retained, peak = _measure(configuration)
+        if sorted(int(game.launch_id) for game in collection) != sorted(launch_ids):
+            raise AssertionError(f"wrong games parsed from {size} records")
+        parse_seconds, append_seconds = _time_batch(configuration, repeat)
+        results.append({
+            'games': size,
+            'bytes': len(configuration),
+            'seconds': elapsed,
+            'parse_seconds': parse_seconds,
+            'append_seconds': append_seconds,
+            # what the collection keeps once the garbage of the parse is collected
+            'retained_bytes': retained,
+            # memory used on top of that while parsing
+            'transient_peak_bytes': peak - retained,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,88 @@
+"""Event loop lag regression check: fails when a plugin handler blocks the loop for longer than the threshold"""
+import asyncio
+import json
+import sys
+import tempfile
+
+from synthetic import create_launcher_directory, memory_registry
+from fake_backend import FakeUbisoft, RedirectingSession
+from bench_plugin import NullWriter
+from local import LocalParser
+from registry import registry
+import storage
+from plugin import UplayPlugin
+
+PROBE_INTERVAL = 0.005
+
+
+class LagProbe(object):
+    """Measures how late a callback scheduled every PROBE_INTERVAL fires while a handler runs"""
+    def __init__(self):
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + PROBE_INTERVAL
+            await asyncio.sleep(PROBE_INTERVAL)
+            self.max_lag = max(self.max_lag, loop.time() - expected)
+
+    async def measure(self, call):
+        self.max_lag = 0.0
+        self._task = asyncio.create_task(self._probe())
+        await asyncio.sleep(0)
+        try:
+            await call
+        finally:
+            self._task.cancel()
+        return self.max_lag
+
+
+async def _measure_handlers(fake):
+    plugin = UplayPlugin(asyncio.StreamReader(), NullWriter(), 'token')
+    plugin.client._session = RedirectingSession(fake.url)
+    probe = LagProbe()
+
+    async def ticks(count):
+        for _ in range(count):
+            plugin.tick()
+            await asyncio.sleep(0.01)
+
+    return {
+        'authenticate': await probe.measure(plugin.authenticate(fake.credentials())),
+        'get_owned_games': await probe.measure(plugin.get_owned_games()),
+        'get_local_games': await probe.measure(plugin.get_local_games()),
+        'get_game_times': await probe.measure(plugin.get_game_times()),
+        'tick': await probe.measure(ticks(20)),
+    }
+
+
+def run(games=1000, threshold=0.1):
+    with tempfile.TemporaryDirectory() as root:
+        fake = FakeUbisoft(latency=0.01)
+        launcher, registry_values, _ = create_launcher_directory(root, games, user_id=fake.user_id)
+        registry.set_backend(memory_registry(registry_values))
+        storage.PLUGIN_DATA_PATH = root
+        with open(f'{launcher}/cache/configuration/configurations', 'rb') as f:
+            fake.space_ids = [game.space_id for game in LocalParser().parse_games(f.read())]
+        with fake:
+            lags = asyncio.run(_measure_handlers(fake))
+    blocking = {name: lag for name, lag in lags.items() if lag > threshold}
+    result = {
+        'games': games,
+        'threshold_seconds': threshold,
+        'max_lag_seconds': lags,
+        'passed': not blocking,
+    }
+    if blocking:
+        raise AssertionError(f"Handlers blocked the event loop for longer than {threshold}s: {json.dumps(result)}")
+    return result
+
+
+if __name__ == "__main__":
+    try:
+        print(json.dumps(run(), indent=2))
+    except AssertionError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
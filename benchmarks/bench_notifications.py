@@ -0,0 +1,102 @@
+"""Local game status messages sent to Galaxy per hour of a replayed busy session, with and without batching"""
+import json
+import random
+import tempfile
+
+from synthetic import create_launcher_directory, memory_registry
+from bench_plugin import NullWriter
+from definitions import GameStatus
+from metrics import metrics
+from notifications import LocalGameStatusBatcher
+from registry import registry
+from plugin import UplayPlugin
+
+SESSION_TICKS = 3600
+
+
+def busy_session(installed, seed=0, launcher_restart_every=600, games_started_per_hour=30, installs_per_hour=6):
+    """Returns {tick: [(launch_id, status)]} the status notifier reports during an hour.
+    Games are started and stopped, launcher restarts make every running game flap between running and installed
+    and install state of some games toggles back and forth while the launcher updates them."""
+    rng = random.Random(seed)
+    events = {}
+
+    def report(tick, launch_id, status):
+        events.setdefault(tick, []).append((launch_id, status))
+
+    running = {}
+    for _ in range(games_started_per_hour):
+        launch_id = rng.choice(installed)
+        start = rng.randrange(SESSION_TICKS)
+        running[launch_id] = (start, min(SESSION_TICKS - 1, start + rng.randrange(60, 1800)))
+    for launch_id, (start, stop) in running.items():
+        report(start, launch_id, GameStatus.Running)
+        report(stop, launch_id, GameStatus.Installed)
+    for restart in range(launcher_restart_every, SESSION_TICKS, launcher_restart_every):
+        for launch_id, (start, stop) in running.items():
+            if start < restart < stop:
+                for offset, status in enumerate((GameStatus.Installed, GameStatus.Running) * 2):
+                    report(restart + offset // 2, launch_id, status)
+    for _ in range(installs_per_hour):
+        launch_id = rng.choice(installed)
+        tick = rng.randrange(SESSION_TICKS - 5)
+        report(tick, launch_id, GameStatus.NotInstalled)
+        report(tick, launch_id, GameStatus.Installed)
+    return events
+
+
+def _replay(plugin, events):
+    clock = [0.0]
+    plugin.status_notifications.clock = lambda: clock[0]
+    notifier = plugin.game_status_notifier
+    for tick in range(SESSION_TICKS):
+        clock[0] = float(tick)
+        for launch_id, status in events.get(tick, ()):
+            notifier._set_status(notifier.statuses, str(launch_id), status)
+        plugin.refresh_game_statuses()
+        if tick % 9 == 0:
+            plugin._update_local_games_status()
+        plugin.status_notifications.flush()
+
+
+def run(games=500, seed=0):
+    with tempfile.TemporaryDirectory() as root:
+        launcher, registry_values, launch_ids = create_launcher_directory(root, games, seed=seed)
+        registry.set_backend(memory_registry(registry_values))
+        installed = [int(path.rsplit('\\', 1)[1]) for _, path, _, _ in registry_values[1:]]
+
+        plugin = UplayPlugin(None, NullWriter(), 'token')
+        # the replay runs without an event loop, Plugin.update_local_game_status of the galaxy API needs one
+        sent = []
+        plugin.status_notifications = LocalGameStatusBatcher(sent.append)
+        plugin.local_client.initialize('user')
+        plugin.status_notifications.set_known(plugin._collect_local_games(
+            list(plugin.games_collection.merge(plugin._read_configuration()))))
+        plugin._update_local_games_status()
+        for launch_id in installed:
+            notifier = plugin.game_status_notifier
+            notifier._set_status(notifier.statuses, str(launch_id), GameStatus.Installed)
+
+        metrics_enabled = metrics.enabled
+        metrics.enabled = True
+        before = metrics.snapshot()['counters']
+        _replay(plugin, busy_session(installed, seed=seed))
+        after = metrics.snapshot()['counters']
+        metrics.enabled = metrics_enabled
+
+    def counted(name):
+        return after.get(name, 0) - before.get(name, 0)
+
+    return {
+        'games': games,
+        'installed': len(installed),
+        # every queued update used to be sent right away
+        'messages_per_hour_unbatched': counted('notifications.queued'),
+        'messages_per_hour_batched': len(sent),
+        'coalesced': counted('notifications.coalesced'),
+        'dropped_noops': counted('notifications.dropped'),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
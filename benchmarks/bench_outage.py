@@ -0,0 +1,47 @@
+"""Time and requests spent syncing library stats while the backend answers every request with an error"""
+import asyncio
+import json
+import time
+
+import synthetic  # noqa: F401 puts plugin sources on the import path
+from fake_backend import FakeUbisoft, RedirectingSession
+from backend import BackendClient
+from circuit_breaker import CircuitBreaker
+
+
+class NullPlugin(object):
+    def store_credentials(self, credentials):
+        pass
+
+
+async def _sync(fake, failure_threshold):
+    client = BackendClient(NullPlugin())
+    client._session = RedirectingSession(fake.url)
+    client.restore_credentials(fake.credentials())
+    host = 'public-ubiservices.ubi.com'
+    client._circuit_breakers[host] = CircuitBreaker(host, failure_threshold=failure_threshold)
+
+    requests_before = fake.requests_count
+    start = time.perf_counter()
+    results = await asyncio.gather(*[client.get_game_stats(space_id) for space_id in fake.space_ids],
+                                   return_exceptions=True)
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    return {
+        'seconds': time.perf_counter() - start,
+        'requests_sent': fake.requests_count - requests_before,
+        'failed': failed,
+    }
+
+
+def run(games=200, latency=0.1):
+    results = {}
+    with FakeUbisoft(games_count=games, latency=latency, error_rate=1.0) as fake:
+        for name, threshold in (('no_circuit', float('inf')), ('circuit', CircuitBreaker('').failure_threshold)):
+            results[name] = asyncio.run(_sync(fake, threshold))
+    if results['circuit']['requests_sent'] >= results['no_circuit']['requests_sent']:
+        raise AssertionError(f"Open circuit did not cut requests to a failing backend: {results}")
+    return {'games': games, 'latency': latency, 'results': results}
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
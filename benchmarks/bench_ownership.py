@@ -0,0 +1,161 @@
+"""Compares the ownership parser with the one it replaced and checks it against a round-trip and fuzzed corpus"""
+import json
+import logging
+import math
+import random
+import time
+
+from synthetic import generate_ownership, encode_ownership_record
+from local import LocalParser
+from consts import OWNERSHIP_HEADER_SIZE
+
+
+class LegacyOwnershipParser(object):
+    """Ownership parser as it was before the varint decoder"""
+    def _convert_data(self, data):
+        # calculate object size (konrad's formula)
+        if data > 256 * 256:
+            data = data - (128 * 256 * math.ceil(data / (256 * 256)))
+            data = data - (128 * math.ceil(data / 256))
+        else:
+            if data > 256:
+                data = data - (128 * math.ceil(data / 256))
+        return data
+
+    def _parse_ownership_header(self, header):
+        offset = 1
+        multiplier = 1
+        record_size = 0
+        tmp_size = 0
+        if header[offset - 1] == 0x0a:
+            while header[offset] != 0x08 or record_size == 0:
+                record_size += header[offset] * multiplier
+                multiplier *= 256
+                offset += 1
+                tmp_size += 1
+
+            record_size = self._convert_data(record_size)
+
+            offset += 1  # skip 0x08
+
+            # look for launch_id
+            multiplier = 1
+            launch_id = 0
+
+            while header[offset] != 0x10 or header[offset + 1] == 0x10:
+                launch_id += header[offset] * multiplier
+                multiplier *= 256
+                offset += 1
+
+            launch_id = self._convert_data(launch_id)
+
+            offset += 1  # skip 0x10
+
+            multiplier = 1
+            launch_id_2 = 0
+            while header[offset] != 0x22:
+                launch_id_2 += header[offset] * multiplier
+                multiplier *= 256
+                offset += 1
+
+            launch_id_2 = self._convert_data(launch_id_2)
+            return launch_id, launch_id_2, record_size + tmp_size + 1
+        else:
+            return None, None, None
+
+    def parse(self, ownership_content):
+        global_offset = 0x108
+        records = []
+        while global_offset < len(ownership_content):
+            data = ownership_content[global_offset:]
+            launch_id, launch_id2, record_size = self._parse_ownership_header(data)
+            if launch_id:
+                records.append(launch_id)
+                if launch_id2 != launch_id:
+                    records.append(launch_id2)
+                global_offset += record_size
+            else:
+                break
+        return records
+
+
+def _best_of(repeat, function, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _lookup_all(records, launch_ids):
+    for launch_id in launch_ids:
+        launch_id in records
+
+
+def check_round_trip(cases=500, seed=1):
+    rng = random.Random(seed)
+    for case in range(cases):
+        content, owned = generate_ownership(rng.randint(0, 50), seed=case, max_launch_id=2 ** rng.randint(1, 40),
+                                            extra_payload=300)
+        parsed = LocalParser().get_owned_local_games(content)
+        if parsed != owned:
+            raise AssertionError(f"round trip mismatch in case {case}: {sorted(owned ^ parsed)[:10]}")
+    return cases
+
+
+def check_fuzzed(cases=2000, seed=2):
+    """Truncated and corrupted files must never raise, truncated ones must never report ids beyond the valid prefix"""
+    rng = random.Random(seed)
+    logging.disable(logging.WARNING)
+    try:
+        for case in range(cases):
+            content, owned = generate_ownership(rng.randint(1, 30), seed=case)
+            mutated = bytearray(content)
+            truncated = rng.random() < 0.5
+            if truncated:
+                del mutated[rng.randint(OWNERSHIP_HEADER_SIZE, len(mutated)):]
+            else:
+                for _ in range(rng.randint(1, 5)):
+                    mutated[rng.randrange(OWNERSHIP_HEADER_SIZE, len(mutated))] = rng.getrandbits(8)
+            parsed = LocalParser().get_owned_local_games(bytes(mutated))
+            if truncated and not parsed <= owned:
+                raise AssertionError(f"truncated file in case {case} reported ids it doesn't own: "
+                                     f"{sorted(parsed - owned)[:10]}")
+    finally:
+        logging.disable(logging.NOTSET)
+    # unknown fields and wire types are skipped
+    content = bytes(OWNERSHIP_HEADER_SIZE) + encode_ownership_record(123, 456, [(3, 7), (5, b'x' * 200), (6, b'')])
+    if LocalParser().get_owned_local_games(content) != {123, 456}:
+        raise AssertionError("unknown fields not skipped")
+    return cases
+
+
+def run(sizes=(100, 1000, 5000, 20000), repeat=3):
+    results = {
+        'round_trip_cases': check_round_trip(),
+        'fuzzed_cases': check_fuzzed(),
+        'parse': []
+    }
+    for size in sizes:
+        content, owned = generate_ownership(size)
+        legacy = LegacyOwnershipParser()
+        if LocalParser().get_owned_local_games(content) != owned:
+            raise AssertionError(f"wrong launch ids parsed from {size} records")
+        results['parse'].append({
+            'records': size,
+            'bytes': len(content),
+            # launch ids with varint bytes equal to the field tags throw the old byte scanning off
+            'legacy_wrong_launch_ids': len((set(legacy.parse(content)) - {0}) ^ owned),
+            'legacy_seconds': _best_of(repeat, legacy.parse, content),
+            'varint_seconds': _best_of(repeat, LocalParser().get_owned_local_games, content),
+            # plugin checks every game of the library against parsed records
+            'legacy_lookup_seconds': _best_of(repeat, _lookup_all, legacy.parse(content), owned),
+            'varint_lookup_seconds': _best_of(repeat, _lookup_all, LocalParser().get_owned_local_games(content), owned),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,75 @@
+"""End to end timings of plugin calls against synthetic launcher files and the fake backend.
+Warm runs start with results persisted by the cold run, as a restarted plugin would."""
+import asyncio
+import json
+import tempfile
+import time
+
+from synthetic import create_launcher_directory, memory_registry
+from fake_backend import FakeUbisoft, RedirectingSession
+from local import LocalParser
+from registry import registry
+import storage
+from plugin import UplayPlugin
+
+
+class NullWriter(object):
+    """Drops every message the plugin sends to Galaxy"""
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def _timed(call):
+    start = time.perf_counter()
+    result = await call
+    return result, time.perf_counter() - start
+
+
+async def _run_once(fake, launch_ids):
+    plugin = UplayPlugin(asyncio.StreamReader(), NullWriter(), 'token')
+    plugin.client._session = RedirectingSession(fake.url)
+    _, authenticate = await _timed(plugin.authenticate(fake.credentials()))
+    owned_games, get_owned_games = await _timed(plugin.get_owned_games())
+    local_games, get_local_games = await _timed(plugin.get_local_games())
+    game_times, get_game_times = await _timed(plugin.get_game_times())
+    if len(owned_games) != len(launch_ids):
+        raise AssertionError(f"{len(owned_games)} owned games reported, expected {len(launch_ids)}")
+    while plugin.owned_games.refreshing or plugin.game_times.refreshing:
+        await asyncio.sleep(0.01)
+    return {
+        'owned_games': len(owned_games),
+        'local_games': len(local_games),
+        'game_times': len(game_times),
+        'authenticate_seconds': authenticate,
+        'get_owned_games_seconds': get_owned_games,
+        'get_local_games_seconds': get_local_games,
+        'get_game_times_seconds': get_game_times,
+    }
+
+
+def run(sizes=(10, 100, 500), latency=0.02, error_rate=0.0):
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            fake = FakeUbisoft(latency=latency, error_rate=error_rate)
+            launcher, registry_values, launch_ids = create_launcher_directory(root, size, user_id=fake.user_id)
+            registry.set_backend(memory_registry(registry_values))
+            storage.PLUGIN_DATA_PATH = root
+            with open(f'{launcher}/cache/configuration/configurations', 'rb') as f:
+                fake.space_ids = [game.space_id for game in LocalParser().parse_games(f.read())]
+            with fake:
+                cold = asyncio.run(_run_once(fake, launch_ids))
+                warm = asyncio.run(_run_once(fake, launch_ids))
+            results.append({'games': size, 'latency': latency, 'requests': fake.requests_count,
+                            'cold': cold, 'warm': warm})
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
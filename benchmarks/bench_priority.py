@@ -0,0 +1,57 @@
+"""Latency of interactive requests while a full library stats sync keeps the request budget busy"""
+import asyncio
+import json
+import statistics
+import time
+
+import synthetic  # noqa: F401 puts plugin sources on the import path
+from fake_backend import FakeUbisoft, RedirectingSession
+from backend import BackendClient
+from priority_budget import PriorityBudget, RequestPriority, AdaptiveLimit
+
+
+class FifoBudget(PriorityBudget):
+    """Serves every request in arrival order, as the plain semaphore did"""
+    def slot(self, priority):
+        return super().slot(RequestPriority.BACKGROUND)
+
+
+class NullPlugin(object):
+    def store_credentials(self, credentials):
+        pass
+
+
+async def _measure(fake, budget, interactive_requests, interval):
+    client = BackendClient(NullPlugin(), budget.limit)
+    client._session = RedirectingSession(fake.url)
+    client._request_budget = budget
+    client._adaptive_limit = AdaptiveLimit(budget)
+    client.restore_credentials(fake.credentials())
+
+    sync = asyncio.ensure_future(asyncio.gather(*[client.get_game_stats(space_id) for space_id in fake.space_ids]))
+    latencies = []
+    for _ in range(interactive_requests):
+        await asyncio.sleep(interval)
+        start = time.perf_counter()
+        await client.get_challenges(fake.space_ids[0], limit=10)
+        latencies.append(time.perf_counter() - start)
+    sync_started = time.perf_counter()
+    await sync
+    client.shutdown()
+    return {
+        'interactive_median_seconds': statistics.median(latencies),
+        'interactive_max_seconds': max(latencies),
+        'sync_remaining_seconds': time.perf_counter() - sync_started,
+    }
+
+
+def run(games=500, latency=0.05, interactive_requests=10, interval=0.1, limit=10):
+    results = {}
+    with FakeUbisoft(games_count=games, latency=latency) as fake:
+        for name, budget in (('fifo', FifoBudget(limit)), ('prioritized', PriorityBudget(limit))):
+            results[name] = asyncio.run(_measure(fake, budget, interactive_requests, interval))
+    return {'games': games, 'latency': latency, 'results': results}
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
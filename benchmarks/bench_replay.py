@@ -0,0 +1,400 @@
+"""Replays a Galaxy JSON-RPC session against the whole plugin, through the same streams Galaxy talks over.
+The plugin runs against the fake backend and a synthetic launcher install, on a clock running `speed` times
+faster than the wall clock so hours of a session pass in minutes. Reports latency percentiles of every method,
+event loop lag and peak memory of the process.
+
+A session is a JSON lines file of {"at": seconds since start, "message": JSON-RPC message as Galaxy sent it},
+messages with an id are requests, the others notifications. Stored credentials and request ids are replaced
+on replay. Without --session a synthetic session of --hours is generated for --legs, --record writes it out
+for editing. Plugin API versions route a leg through different methods, the synthetic session uses the ones the
+installed API registers. A default leg the installed API and the plugin can't drive is skipped and listed
+in the report, a leg asked for with --legs fails the replay instead of passing without being driven. Requests time out after --request-timeout wall clock seconds."""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import selectors
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from galaxy.api.plugin import Plugin
+
+from synthetic import create_launcher_directory, memory_registry
+from fake_backend import FakeUbisoft, RedirectingSession
+from local import LocalParser
+from local_io import local_io
+from registry import registry
+import storage
+from plugin import UplayPlugin
+
+Route = namedtuple('Route', ['method', 'handler', 'finished', 'per_game'])
+
+# Methods the plugin API versions import a leg through: the plugin method the API calls,
+# the notification a started import finishes with and whether a request imports a single game
+LEGS = {
+    'owned_games': [Route('import_owned_games', 'get_owned_games', None, False)],
+    'local_games': [Route('import_local_games', 'get_local_games', None, False)],
+    'friends': [Route('import_friends', 'get_friends', None, False)],
+    'game_times': [Route('import_game_times', 'get_game_times', None, False),
+                   Route('start_game_times_import', 'get_game_time', 'game_times_import_finished', False)],
+    'achievements': [Route('import_unlocked_achievements', 'get_unlocked_achievements', None, True),
+                     Route('start_achievements_import', 'get_unlocked_achievements',
+                           'achievements_import_finished', False)],
+}
+# challenges are not exposed as achievements, so the plugin has no achievements leg
+DEFAULT_LEGS = ('owned_games', 'local_games', 'friends', 'game_times')
+FINISHED_NOTIFICATIONS = {route.method: route.finished for routes in LEGS.values() for route in routes}
+
+
+class UnsupportedLeg(Exception):
+    pass
+
+
+def _registered_methods(plugin):
+    return set(plugin._server._methods)
+
+
+def resolve_legs(plugin, legs, skip_unsupported=False):
+    """Route of every leg through the installed API and the legs skipped for having none,
+    raises UnsupportedLeg for a leg without one unless skip_unsupported"""
+    registered = _registered_methods(plugin)
+    routes = {}
+    skipped = []
+    for leg in legs:
+        for route in LEGS[leg]:
+            implemented = getattr(type(plugin), route.handler, None) is not getattr(Plugin, route.handler, None)
+            if route.method in registered and implemented:
+                routes[leg] = route
+                break
+        else:
+            if skip_unsupported:
+                skipped.append(leg)
+                continue
+            candidates = ', '.join(f"{route.method} calling {route.handler}" for route in LEGS[leg])
+            raise UnsupportedLeg(f"Leg {leg} is not supported by the plugin under the installed API, "
+                                 f"none of {candidates} is both registered and implemented")
+    return routes, skipped
+
+
+class SimulatedClock(object):
+    """Makes time.time and time.monotonic, and with them the event loop clock, run speed times faster"""
+    def __init__(self, speed):
+        self.speed = speed
+        self._time = time.time
+        self._monotonic = time.monotonic
+
+    def __enter__(self):
+        origin_time = self._time()
+        origin = self._monotonic()
+        time.monotonic = lambda: origin + (self._monotonic() - origin) * self.speed
+        time.time = lambda: origin_time + (self._monotonic() - origin) * self.speed
+        return self
+
+    def __exit__(self, *exc):
+        time.time = self._time
+        time.monotonic = self._monotonic
+
+
+class ScaledSelector(selectors.DefaultSelector):
+    """Waits for I/O the wall clock time of a simulated timeout, timers of the event loop fire on time"""
+    def __init__(self, speed):
+        super().__init__()
+        self.speed = speed
+
+    def select(self, timeout=None):
+        return super().select(None if timeout is None else timeout / self.speed)
+
+
+def _percentiles(values):
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': round(values[len(values) // 2] * 1000, 3),
+        'p90_ms': round(values[min(len(values) - 1, int(len(values) * 0.9))] * 1000, 3),
+        'p99_ms': round(values[min(len(values) - 1, int(len(values) * 0.99))] * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3),
+    }
+
+
+class GalaxyConnection(object):
+    """Galaxy's end of the plugin streams.
+    Requests are fed into the reader the plugin reads, the connection itself is the writer the plugin writes to.
+    timeout is in simulated seconds."""
+    def __init__(self, timeout):
+        self.reader = asyncio.StreamReader()
+        self.timeout = timeout
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.notifications = Counter()
+        self._buffer = b''
+        self._pending = {}
+        self._awaited_notifications = defaultdict(list)
+        self._next_id = 0
+
+    def write(self, data):
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split(b'\n')
+        for line in lines:
+            if line.strip():
+                self._dispatch(json.loads(line))
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    def _dispatch(self, message):
+        future = self._pending.pop(message.get('id'), None)
+        if future is not None:
+            if not future.done():
+                future.set_result(message)
+        elif 'method' in message:
+            method = message['method']
+            self.notifications[method] += 1
+            if method.endswith('_import_failure'):
+                self.errors[f"{method} {(message.get('params') or {}).get('error', {}).get('message')}"] += 1
+            for waiter in self._awaited_notifications.pop(method, []):
+                if not waiter.done():
+                    waiter.set_result(message)
+        elif 'error' in message:
+            # the plugin could not parse or route a request, it answers without an id
+            self.errors[f"invalid request {message['error'].get('message')}"] += 1
+
+    def _send(self, message):
+        self.reader.feed_data((json.dumps(message) + '\n').encode('utf-8'))
+
+    async def request(self, method, params=None, finished=None):
+        """Latency of a started import lasts until its finished notification"""
+        loop = asyncio.get_event_loop()
+        self._next_id += 1
+        request_id = str(self._next_id)
+        future = loop.create_future()
+        self._pending[request_id] = future
+        waiter = None
+        if finished is not None:
+            waiter = loop.create_future()
+            self._awaited_notifications[finished].append(waiter)
+        start = time.perf_counter()
+        self._send({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params or {}})
+        try:
+            response = await asyncio.wait_for(future, self.timeout)
+            if waiter is not None and 'error' not in response:
+                await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            self._pending.pop(request_id, None)
+            self.errors[f"{method} timed out"] += 1
+            return None
+        self.latencies[method].append(time.perf_counter() - start)
+        error = response.get('error')
+        if error is not None:
+            self.errors[f"{method} {error.get('message')}"] += 1
+        return response
+
+    def notify(self, method, params=None):
+        self._send({'jsonrpc': '2.0', 'method': method, 'params': params or {}})
+
+    def disconnect(self):
+        self.reader.feed_eof()
+
+
+def synthetic_session(routes, registered, game_ids, hours, refresh_interval=15 * 60, achievements_interval=0.05):
+    """Galaxy connecting, importing the legs routes maps to methods, refreshing them every refresh_interval
+    and closing. registered are the methods of the installed API."""
+    session = [(0, 'get_capabilities', {})]
+    if 'initialize_cache' in registered:
+        session.append((0, 'initialize_cache', {'data': {}}))
+    session.append((0.5, 'init_authentication', {'stored_credentials': {}}))
+    for at in range(1, int(hours * 3600), refresh_interval):
+        for offset, leg in enumerate(('owned_games', 'local_games', 'friends', 'game_times')):
+            if leg in routes:
+                params = {'game_ids': list(game_ids)} if routes[leg].finished else {}
+                session.append((at + offset // 2, routes[leg].method, params))
+        route = routes.get('achievements')
+        if route is not None and route.per_game:
+            session += [(at + 2 + i * achievements_interval, route.method, {'game_id': game_id})
+                        for i, game_id in enumerate(game_ids)]
+        elif route is not None:
+            session.append((at + 2, route.method, {'game_ids': list(game_ids)}))
+    session.append((hours * 3600, 'shutdown', {}))
+    return [{'at': at, 'message': {'jsonrpc': '2.0', 'id': str(i), 'method': method, 'params': params}}
+            for i, (at, method, params) in enumerate(session)]
+
+
+def load_session(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_session(path, session):
+    with open(path, 'w', encoding='utf-8') as f:
+        for step in session:
+            f.write(json.dumps(step) + '\n')
+
+
+async def _probe_lag(lags, speed, interval=1):
+    """Wall clock lateness of a timer firing every simulated interval"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - start - interval / speed))
+
+
+def _raise_if_stopped(running):
+    """Surfaces an exception the plugin stopped with, or it stopping before the session ended"""
+    if running.done():
+        running.result()
+        raise RuntimeError("Plugin stopped before the session ended")
+
+
+async def _replay(fake, session, speed, legs, hours, record, request_timeout):
+    connection = GalaxyConnection(request_timeout * speed)
+    plugin = UplayPlugin(connection.reader, connection, 'token')
+    plugin.client._session = RedirectingSession(fake.url)
+    registered = _registered_methods(plugin)
+    skipped = []
+    if session is None:
+        routes, skipped = resolve_legs(plugin, legs or DEFAULT_LEGS, skip_unsupported=legs is None)
+        session = synthetic_session(routes, registered, fake.space_ids, hours)
+    else:
+        unknown = {step['message']['method'] for step in session if 'id' in step['message']} - registered
+        if unknown:
+            raise UnsupportedLeg(f"Session requests methods the installed API does not register: {sorted(unknown)}")
+    if record:
+        save_session(record, session)
+    tick_durations = []
+    tick = plugin.tick
+
+    def timed_tick():
+        start = time.perf_counter()
+        try:
+            tick()
+        finally:
+            tick_durations.append(time.perf_counter() - start)
+    plugin.tick = timed_tick
+
+    lags = []
+    probe = asyncio.ensure_future(_probe_lag(lags, speed))
+    running = asyncio.ensure_future(plugin.run())
+    loop = asyncio.get_event_loop()
+    started = loop.time()
+    requests = []
+    for step in sorted(session, key=lambda step: step['at']):
+        delay = started + step['at'] - loop.time()
+        if delay > 0:
+            await asyncio.wait([running], timeout=delay)
+        _raise_if_stopped(running)
+        message = step['message']
+        params = dict(message.get('params') or {})
+        if message['method'] == 'init_authentication':
+            params['stored_credentials'] = fake.credentials()
+        if 'id' in message:
+            finished = FINISHED_NOTIFICATIONS.get(message['method'])
+            requests.append(asyncio.ensure_future(connection.request(message['method'], params, finished)))
+        else:
+            connection.notify(message['method'], params)
+    answered = asyncio.ensure_future(asyncio.gather(*requests))
+    await asyncio.wait([running, answered], return_when=asyncio.FIRST_COMPLETED)
+    if running.done():
+        # the plugin closes its end after the shutdown request, anything else is surfaced here
+        running.result()
+    await answered
+    simulated = loop.time() - started
+
+    connection.disconnect()
+    try:
+        await asyncio.wait_for(running, 10 * speed)
+    except asyncio.TimeoutError:
+        pass
+    probe.cancel()
+    return plugin.client, {
+        'simulated_seconds': round(simulated, 1),
+        'skipped_legs': skipped,
+        'methods': {method: _percentiles(latencies) for method, latencies in sorted(connection.latencies.items())},
+        'errors': dict(connection.errors),
+        'notifications': dict(connection.notifications),
+        'ticks': _percentiles(tick_durations),
+        'loop_lag': _percentiles(lags),
+    }
+
+
+def run(hours=2, speed=120, games=100, latency=0.02, error_rate=0.0, session=None, record=None,
+        legs=None, request_timeout=120):
+    """legs default to DEFAULT_LEGS, skipping the ones the installed API and the plugin can't drive"""
+    with tempfile.TemporaryDirectory() as root:
+        fake = FakeUbisoft(latency=latency, error_rate=error_rate)
+        launcher, registry_values, _ = create_launcher_directory(root, games, user_id=fake.user_id)
+        registry.set_backend(memory_registry(registry_values))
+        storage.PLUGIN_DATA_PATH = root
+        with open(os.path.join(launcher, 'cache', 'configuration', 'configurations'), 'rb') as f:
+            fake.space_ids = [game.space_id for game in LocalParser().parse_games(f.read())]
+        steps = load_session(session) if session else None
+
+        started = time.perf_counter()
+        loop = asyncio.SelectorEventLoop(ScaledSelector(speed))
+        asyncio.set_event_loop(loop)
+        executor = ThreadPoolExecutor()
+        loop.set_default_executor(executor)
+        try:
+            with fake, SimulatedClock(speed):
+                client, report = loop.run_until_complete(_replay(fake, steps, speed, legs, hours, record, request_timeout))
+                pending = asyncio.all_tasks(loop)
+                for task in pending:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                # requests still running in threads would call back into a closed loop
+                executor.shutdown(wait=True)
+                client.shutdown(wait=True)
+                local_io.shutdown(wait=True)
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+        report.update({
+            'games': games,
+            'speed': speed,
+            'latency': latency,
+            'error_rate': error_rate,
+            'wall_seconds': round(time.perf_counter() - started, 1),
+            'backend_requests': fake.requests_count,
+            # ru_maxrss is in kilobytes on Linux
+            'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=float, default=2, help="length of the synthetic session")
+    parser.add_argument('--speed', type=float, default=120, help="simulated seconds per wall clock second")
+    parser.add_argument('--games', type=int, default=100, help="games in the synthetic launcher and backend")
+    parser.add_argument('--latency', type=float, default=0.02, help="fake backend latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of failing backend requests")
+    parser.add_argument('--session', help="recorded session to replay instead of a synthetic one")
+    parser.add_argument('--record', help="file to write the replayed session to")
+    parser.add_argument('--legs', nargs='+', choices=sorted(LEGS),
+                        help=f"legs of the synthetic session, {' '.join(DEFAULT_LEGS)} if not given")
+    parser.add_argument('--request-timeout', type=float, default=120,
+                        help="wall clock seconds a request may take before it counts as an error")
+    parser.add_argument('--output', help="file to write the report to, printed if not given")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    report = run(args.hours, args.speed, args.games, args.latency, args.error_rate, args.session, args.record,
+                 args.legs, args.request_timeout)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
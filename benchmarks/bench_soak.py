@@ -0,0 +1,123 @@
+"""Per-game state and memory of the plugin over thousands of library changes.
+Every change replaces a part of the games in the launcher configuration and ownership files,
+the same passes as the plugin's periodic local files check and status cycle then run over them.
+The baseline without eviction runs fewer changes, its status cycle gets slower with every one of them."""
+import asyncio
+import json
+import os
+import tempfile
+import tracemalloc
+
+from synthetic import GAME_YAML_TEMPLATE, encode_configuration_record, encode_ownership_record, memory_registry
+from definitions import GameStatus
+from consts import OWNERSHIP_HEADER_SIZE
+from registry import registry
+import storage
+from plugin import UplayPlugin
+from bench_plugin import NullWriter
+
+
+class RunningProcess(object):
+    """Process of a game which keeps running until its game is evicted"""
+    def is_running(self):
+        return True
+
+
+def _write_library(launcher, user_id, launch_ids):
+    configuration = bytearray()
+    ownership = bytearray(OWNERSHIP_HEADER_SIZE)
+    for launch_id in launch_ids:
+        space_id = '%08x-0000-0000-0000-000000000000' % launch_id
+        game_yaml = GAME_YAML_TEMPLATE.format(launch_id=launch_id, space_id=space_id)
+        configuration += encode_configuration_record(launch_id, game_yaml.encode())
+        ownership += encode_ownership_record(launch_id, launch_id)
+    with open(os.path.join(launcher, 'cache', 'configuration', 'configurations'), 'wb') as f:
+        f.write(configuration)
+    with open(os.path.join(launcher, 'cache', 'ownership', user_id), 'wb') as f:
+        f.write(ownership)
+
+
+def _state_sizes(plugin):
+    return {
+        'registry': len(plugin.game_registry),
+        'games_collection': len(plugin.games_collection),
+        'notifier_games': len(plugin.game_status_notifier.games),
+        'notifier_statuses': len(plugin.game_status_notifier.statuses),
+        'cached_game_statuses': len(plugin.cached_game_statuses),
+        'watched_processes': len(plugin.process_watcher.watched_processes),
+    }
+
+
+async def _soak(root, library_size, changes, churn, evict):
+    launcher = os.path.join(root, 'launcher')
+    for directory in ('configuration', 'ownership'):
+        os.makedirs(os.path.join(launcher, 'cache', directory), exist_ok=True)
+    game_path = os.path.join(root, 'game')
+    os.makedirs(game_path, exist_ok=True)
+    with open(os.path.join(game_path, 'uplay_install.state'), 'wb') as f:
+        f.write(b'\x0a' + bytes(31))
+    backend = memory_registry([('HKEY_LOCAL_MACHINE', 'SOFTWARE\\Ubisoft\\Launcher', 'InstallDir', launcher)])
+    registry.set_backend(backend)
+
+    plugin = UplayPlugin(asyncio.StreamReader(), NullWriter(), 'token')
+    if not evict:
+        plugin._evict_vanished_games = lambda launch_ids: None
+    user_id = 'soak'
+    _write_library(launcher, user_id, range(1, library_size + 1))
+    plugin.local_client.initialize(user_id)
+    statuses = {}
+    checkpoints = []
+    tracemalloc.start()
+    try:
+        for change in range(changes + 1):
+            first = change * churn + 1
+            launch_ids = range(first, first + library_size)
+            if change:
+                _write_library(launcher, user_id, launch_ids)
+            # newly added games get installed, one of them is started, removed ones get uninstalled
+            for launch_id in launch_ids[-churn:]:
+                backend.set_value('HKEY_LOCAL_MACHINE', f'SOFTWARE\\Ubisoft\\Launcher\\Installs\\{launch_id}',
+                                  'InstallDir', game_path)
+            for launch_id in range(max(1, first - churn), first):
+                backend.delete_key('HKEY_LOCAL_MACHINE', f'SOFTWARE\\Ubisoft\\Launcher\\Installs\\{launch_id}')
+            await plugin._update_local_games()
+            plugin._update_local_games_status()
+            plugin.game_status_notifier._update_statuses(statuses)
+            game = plugin.games_collection.get(str(launch_ids[-1]))
+            if game is not None and game.status == GameStatus.Installed:
+                plugin.process_watcher.watch_process(RunningProcess(), game)
+            plugin.status_notifications.flush()
+            if hasattr(plugin, 'sent'):
+                plugin.sent.clear()
+            if change % max(1, changes // 10) == 0:
+                current, peak = tracemalloc.get_traced_memory()
+                checkpoints.append(dict(change=change, traced_bytes=current, **_state_sizes(plugin)))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'peak_traced_bytes': peak, 'checkpoints': checkpoints}
+
+
+def run(library_size=20, changes=2000, churn=2, baseline_changes=200, max_growth=100 * 1024):
+    """max_growth bounds the traced memory growth over the second half of the changes,
+    the retained status changes and caches have filled up by then"""
+    results = {}
+    for name, evict, count in (('without_eviction', False, baseline_changes), ('with_eviction', True, changes)):
+        with tempfile.TemporaryDirectory() as root:
+            storage.PLUGIN_DATA_PATH = root
+            results[name] = asyncio.run(_soak(root, library_size, count, churn, evict))
+    final = results['with_eviction']['checkpoints'][-1]
+    oversized = {name: size for name, size in final.items()
+                 if name not in ('change', 'traced_bytes') and size > library_size}
+    if oversized:
+        raise AssertionError(f"Per-game state outgrew the library of {library_size} games: {oversized}")
+    checkpoints = results['with_eviction']['checkpoints']
+    growth = final['traced_bytes'] - checkpoints[len(checkpoints) // 2]['traced_bytes']
+    if growth > max_growth:
+        raise AssertionError(f"Memory grew by {growth} bytes over the second half of the changes")
+    return {'library_size': library_size, 'changes': changes, 'baseline_changes': baseline_changes, 'churn': churn,
+            'results': results}
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
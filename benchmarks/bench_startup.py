@@ -0,0 +1,48 @@
+"""Plugin import and construction time in a fresh interpreter, the part of the handshake the plugin controls"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+_STARTUP_SCRIPT = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import plugin
+imported = time.perf_counter()
+heavy_modules = [name for name in ('yaml', 'psutil', 'requests', 'dateutil', 'webbrowser') if name in sys.modules]
+
+async def construct():
+    plugin.UplayPlugin(None, None, None)
+
+asyncio.run(construct())
+print(json.dumps({
+    'import_seconds': imported - started,
+    'init_seconds': time.perf_counter() - imported,
+    'heavy_modules_loaded': heavy_modules,
+}))
+"""
+
+
+def _measure_once():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [SRC_PATH, env.get('PYTHONPATH')]))
+    output = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT], env=env, check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def run(repeat=10):
+    samples = [_measure_once() for _ in range(repeat)]
+    return {
+        'runs': repeat,
+        'import_seconds_median': statistics.median(sample['import_seconds'] for sample in samples),
+        'init_seconds_median': statistics.median(sample['init_seconds'] for sample in samples),
+        'heavy_modules_loaded': samples[-1]['heavy_modules_loaded'],
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
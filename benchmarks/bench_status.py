@@ -0,0 +1,51 @@
+"""Duration of a single status cycle of GameStatusNotifier against a synthetic launcher install"""
+import json
+import tempfile
+import time
+
+from synthetic import create_launcher_directory, memory_registry
+from definitions import UbisoftGame, GameType, GameStatus
+from local import GameStatusNotifier, ProcessWatcher, LocalClient
+from registry import registry
+
+
+def _notifier_for(launcher, launch_ids):
+    client = LocalClient()
+    notifier = GameStatusNotifier(ProcessWatcher())
+    notifier.launcher_log_path = client.launcher_log_path
+    notifier.launcher_cache_path = client.launcher_cache_path
+    for launch_id in launch_ids:
+        notifier.update_game(UbisoftGame(
+            space_id='', launch_id=str(launch_id), third_party_id='', name=f'Game {launch_id}', path='',
+            type=GameType.New, special_registry_path='', exe='', status=GameStatus.Unknown))
+    return notifier
+
+
+def run(sizes=(10, 100, 1000), cycles=20, log_lines=5000):
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            launcher, registry_values, launch_ids = create_launcher_directory(root, size, log_lines=log_lines)
+            registry.set_backend(memory_registry(registry_values))
+            notifier = _notifier_for(launcher, launch_ids)
+            statuses = {}
+            timings = []
+            for _ in range(cycles):
+                start = time.perf_counter()
+                notifier._update_statuses(statuses)
+                timings.append(time.perf_counter() - start)
+            installed = sum(1 for status in statuses.values() if status == GameStatus.Installed)
+            if installed != len(registry_values) - 1:
+                raise AssertionError(f"{installed} games reported installed, expected {len(registry_values) - 1}")
+            timings.sort()
+            results.append({
+                'games': size,
+                'installed': installed,
+                'first_cycle_seconds': timings[-1],
+                'median_cycle_seconds': timings[len(timings) // 2],
+            })
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,143 @@
+"""Local HTTP server imitating the Ubisoft endpoints used by the plugin, with configurable latency and errors"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import requests
+
+
+class FakeUbisoft(object):
+    def __init__(self, games_count=100, friends_count=50, challenges_per_game=150, latency=0.0, jitter=0.0,
+                 error_rate=0.0, seed=0, space_ids=None):
+        """space_ids are the owned games, games_count random ones are made up if not given"""
+        rng = random.Random(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.user_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        if space_ids is None:
+            space_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(games_count)]
+        self.space_ids = list(space_ids)
+        self.friends = [{'pid': str(uuid.UUID(int=rng.getrandbits(128))), 'nameOnPlatform': f'friend{i}'}
+                        for i in range(friends_count)]
+        self.challenges_per_game = challenges_per_game
+        self.requests_count = 0
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._server = None
+
+    def session_response(self):
+        now = datetime.now(timezone.utc)
+        return {
+            'ticket': 'fake-ticket', 'sessionId': 'fake-session', 'userId': self.user_id,
+            'serverTime': now.isoformat(), 'expiration': (now + timedelta(hours=3)).isoformat(),
+        }
+
+    def credentials(self):
+        return {'ticket': 'fake-ticket', 'sessionId': 'fake-session', 'userId': self.user_id,
+                'rememberMeTicket': 'fake-remember-me', 'refreshTime': str(int(time.time()) + 3600)}
+
+    def _challenges(self, space_id, offset, limit):
+        actions = [{'id': f'{space_id}-{i}', 'name': f'Challenge {i}', 'isBadge': i % 10 == 0,
+                    'isCompleted': i % 3 == 0, 'completionDate': '2019-05-01T12:00:00.000Z'}
+                   for i in range(self.challenges_per_game)]
+        return {'actions': actions[offset:offset + limit]}
+
+    def _statscard(self, space_id):
+        return {'Statscards': [{'format': 'LongTimespan', 'displayName': 'Playtime', 'statName': 'playtime',
+                                'value': str(3600 + len(space_id)), 'unit': 'Seconds',
+                                'lastModified': '2019-05-01T12:00:00.000Z'}]}
+
+    def respond(self, method, path, query):
+        if method == 'OPTIONS':
+            return 200, {}
+        if path in ('/v3/profiles/sessions', '/v2/profiles/sessions'):
+            return 200, self.session_response()
+        if re.fullmatch(r'/v3/users/[^/]+', path):
+            return 200, {'userId': self.user_id, 'username': 'benchmark'}
+        if path == '/v1/profiles/me/club/aggregation/website/games/owned':
+            return 200, [{'spaceId': space_id, 'title': f'Game {i}', 'platform': 'PC'}
+                         for i, space_id in enumerate(self.space_ids)]
+        if path == '/v2/profiles/me/friends':
+            return 200, {'friends': self.friends}
+        if re.fullmatch(r'/v1/profiles/[^/]+/statscard', path):
+            return 200, self._statscard(query.get('spaceId', [''])[0])
+        if re.fullmatch(r'/v1/profiles/[^/]+/club/actions', path):
+            return 200, self._challenges(query.get('spaceId', [''])[0], int(query.get('offset', ['0'])[0]),
+                                         int(query.get('limit', ['100'])[0]))
+        return 404, {}
+
+    def _delay_and_fail(self):
+        with self._lock:
+            self.requests_count += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            fail = self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        return fail
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                if fake._delay_and_fail():
+                    status, body = 503, {}
+                else:
+                    url = urlsplit(self.path)
+                    status, body = fake.respond(self.command, url.path, parse_qs(url.query))
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_OPTIONS = _handle
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class RedirectingSession(requests.Session):
+    """Sends every request meant for Ubisoft servers to the fake backend instead"""
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def request(self, method, url, *args, **kwargs):
+        parts = urlsplit(url)
+        url = self.base_url + parts.path + (f'?{parts.query}' if parts.query else '')
+        return super().request(method, url, *args, **kwargs)
@@ -0,0 +1,63 @@
+"""Runs every benchmark and writes their results into a single JSON document"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+
+import bench_local_games
+import bench_loop_lag
+import bench_notifications
+import bench_outage
+import bench_ownership
+import bench_plugin
+import bench_priority
+import bench_replay
+import bench_soak
+import bench_startup
+import bench_status
+
+BENCHMARKS = {
+    'startup': bench_startup,
+    'ownership': bench_ownership,
+    'local_games': bench_local_games,
+    'status': bench_status,
+    'plugin': bench_plugin,
+    'loop_lag': bench_loop_lag,
+    'notifications': bench_notifications,
+    'priority': bench_priority,
+    'outage': bench_outage,
+    'soak': bench_soak,
+    'replay': bench_replay,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--output', help="file to write results to, printed if not given")
+    parser.add_argument('--only', nargs='*', choices=sorted(BENCHMARKS), help="benchmarks to run")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    report = {
+        'python': sys.version,
+        'platform': platform.platform(),
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': {},
+    }
+    for name in args.only or BENCHMARKS:
+        start = time.perf_counter()
+        report['results'][name] = BENCHMARKS[name].run()
+        print(f"{name} done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Generators of synthetic launcher files in the binary format of the Ubisoft launcher cache"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from consts import OWNERSHIP_HEADER_SIZE  # noqa: E402
+
+
+def encode_varint(value):
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+def encode_field(field, value):
+    if isinstance(value, int):
+        return encode_varint(field << 3) + encode_varint(value)
+    return encode_varint(field << 3 | 2) + encode_varint(len(value)) + value
+
+
+def encode_ownership_record(launch_id, launch_id_2, extra_fields=()):
+    record = encode_field(1, launch_id) + encode_field(2, launch_id_2)
+    for field, value in extra_fields:
+        record += encode_field(field, value)
+    return encode_field(1, record)
+
+
+def generate_ownership(records_count, seed=0, max_launch_id=100000, extra_payload=16):
+    """Returns ownership file content and the set of launch ids it holds"""
+    rng = random.Random(seed)
+    content = bytearray(OWNERSHIP_HEADER_SIZE)
+    owned = set()
+    for _ in range(records_count):
+        launch_id = rng.randint(1, max_launch_id)
+        launch_id_2 = launch_id if rng.random() < 0.7 else rng.randint(1, max_launch_id)
+        payload = bytes(rng.getrandbits(8) for _ in range(rng.randint(0, extra_payload)))
+        content += encode_ownership_record(launch_id, launch_id_2, [(4, payload)])
+        owned.update((launch_id, launch_id_2))
+    return bytes(content), owned
+
+
+GAME_YAML_TEMPLATE = """version: 2.0
+root:
+  name: Synthetic Game {launch_id}
+  space_id: {space_id}
+  installer:
+    game_identifier: Synthetic Game {launch_id}
+  start_game:
+    online:
+      executables:
+        - path:
+            relative: game{launch_id}.exe
+          working_directory:
+            register: HKEY_LOCAL_MACHINE\\\\SOFTWARE\\\\Ubisoft\\\\Launcher\\\\Installs\\\\{launch_id}\\\\InstallDir
+localizations:
+  default:
+    GAMENAME: Synthetic Game {launch_id}
+"""
+
+
+def encode_configuration_record(launch_id, game_yaml, version=1):
+    return encode_field(1, encode_field(1, launch_id) + encode_field(2, version) + encode_field(3, game_yaml))
+
+
+def generate_configuration(games_count, seed=0, padding=0):
+    """Returns configurations file content and the launch ids of games it describes.
+    Padding adds a yaml comment of that many bytes to every record."""
+    rng = random.Random(seed)
+    content = bytearray()
+    launch_ids = rng.sample(range(1, max(games_count * 10, 100)), games_count)
+    for launch_id in launch_ids:
+        space_id = '%08x-%04x-%04x-%04x-%012x' % tuple(rng.getrandbits(bits) for bits in (32, 16, 16, 16, 48))
+        game_yaml = GAME_YAML_TEMPLATE.format(launch_id=launch_id, space_id=space_id)
+        if padding:
+            game_yaml += '# ' + 'x' * padding + '\n'
+        content += encode_configuration_record(launch_id, game_yaml.encode())
+    return bytes(content), launch_ids
+
+
+def generate_launcher_log(lines_count, running=(), seed=0):
+    """Returns launcher log content, running is a list of (launch_id, pid) pairs logged as started at the end"""
+    rng = random.Random(seed)
+    noise = [
+        "[2019-06-01 12:00:00] [info] [Connection] Connection established",
+        "[2019-06-01 12:00:01] [info] [Downloader] Checking for updates of product {launch_id}",
+        "[2019-06-01 12:00:02] [debug] [Overlay] Overlay settings refreshed",
+    ]
+    lines = [rng.choice(noise).format(launch_id=rng.randint(1, 10000)) for _ in range(lines_count)]
+    for launch_id, pid in running:
+        lines.append(f"[2019-06-01 12:00:03] [info] [Game] Game with process id {pid} has been started "
+                     f"with product id {launch_id}")
+    return "\n".join(lines) + "\n"
+
+
+def create_launcher_directory(root, games_count, installed_ratio=0.5, log_lines=1000, user_id='user', seed=0):
+    """Lays out a launcher install with cache files, launcher log and game directories under root.
+    Returns the launcher directory, registry values to put into a registry backend and parsed launch ids."""
+    rng = random.Random(seed)
+    launcher = os.path.join(root, 'launcher')
+    os.makedirs(os.path.join(launcher, 'cache', 'configuration'), exist_ok=True)
+    os.makedirs(os.path.join(launcher, 'cache', 'ownership'), exist_ok=True)
+    os.makedirs(os.path.join(launcher, 'logs'), exist_ok=True)
+
+    configuration, launch_ids = generate_configuration(games_count, seed=seed)
+    with open(os.path.join(launcher, 'cache', 'configuration', 'configurations'), 'wb') as f:
+        f.write(configuration)
+
+    ownership = bytearray(OWNERSHIP_HEADER_SIZE)
+    for launch_id in launch_ids:
+        ownership += encode_ownership_record(launch_id, launch_id)
+    with open(os.path.join(launcher, 'cache', 'ownership', user_id), 'wb') as f:
+        f.write(bytes(ownership))
+
+    with open(os.path.join(launcher, 'logs', 'launcher_log.txt'), 'w') as f:
+        f.write(generate_launcher_log(log_lines, seed=seed))
+
+    registry_values = [('HKEY_LOCAL_MACHINE', 'SOFTWARE\\Ubisoft\\Launcher', 'InstallDir', launcher)]
+    for launch_id in launch_ids:
+        if rng.random() >= installed_ratio:
+            continue
+        game_path = os.path.join(root, 'games', str(launch_id))
+        os.makedirs(game_path, exist_ok=True)
+        with open(os.path.join(game_path, 'uplay_install.state'), 'wb') as f:
+            f.write(b'\x0a' + bytes(31))
+        registry_values.append(('HKEY_LOCAL_MACHINE', f'SOFTWARE\\Ubisoft\\Launcher\\Installs\\{launch_id}',
+                                'InstallDir', game_path))
+    return launcher, registry_values, launch_ids
+
+
+def memory_registry(registry_values):
+    from registry import MemoryBackend
+    backend = MemoryBackend()
+    for hive, path, name, value in registry_values:
+        backend.set_value(hive, path, name, value)
+    return backend
@@ -1,22 +1,34 @@
 import asyncio
 from datetime import datetime
 import functools
-import requests
 import logging as log
+import time
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
-import dateutil.parser
+from urllib.parse import urlsplit
 
 from galaxy.api.errors import (
     UnknownError, BackendNotAvailable, BackendError, AccessDenied
 )
 
-from consts import CLUB_APPID, CHROME_USERAGENT
+from consts import CLUB_APPID, CHROME_USERAGENT, MAX_REQUESTS_IN_FLIGHT, BACKEND_REQUEST_TIMEOUT
+from metrics import metrics, endpoint_name
+from priority_budget import PriorityBudget, RequestPriority, AdaptiveLimit
+from circuit_breaker import CircuitBreaker
 
 
 class BackendClient(object):
-    def __init__(self, plugin):
+    def __init__(self, plugin, max_requests_in_flight=MAX_REQUESTS_IN_FLIGHT):
         self._plugin = plugin
-        self.session = requests.Session()
+        self._session = None
+        # shared by every request so batch fetches can't flood the executor or the servers,
+        # free slots go to authentication and interactive requests first
+        self._request_budget = PriorityBudget(max_requests_in_flight)
+        # requests granted a slot must not queue again behind others in a shared executor
+        self._max_workers = max_requests_in_flight
+        self._executor = None
+        self._adaptive_limit = AdaptiveLimit(self._request_budget)
+        self._circuit_breakers = {}
         self._auth_lost_callback = None
         self.token = None
         self.session_id = None
@@ -25,16 +37,84 @@ class BackendClient(object):
         self.user_id = None
         self.__refresh_in_progress = False
 
+    @property
+    def session(self):
+        # requests takes a while to import, it is not needed before first request
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self._max_workers, thread_name_prefix='backend')
+        return self._executor
+
+    def shutdown(self, wait=False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
     def set_auth_lost_callback(self, callback):
         self._auth_lost_callback = callback
 
     def is_authenticated(self):
         return self.token is not None
 
-    async def _do_request(self, method, url, *args, **kwargs):
+    def _circuit_breaker(self, url):
+        host = urlsplit(url).hostname
+        breaker = self._circuit_breakers.get(host)
+        if breaker is None:
+            breaker = self._circuit_breakers[host] = CircuitBreaker(host)
+        return breaker
+
+    async def _do_request(self, method, url, *args, priority=RequestPriority.INTERACTIVE, **kwargs):
         loop = asyncio.get_running_loop()
-        r = await loop.run_in_executor(None, functools.partial(self.session.request, method, url, *args, **kwargs))
+        request_name = None
+        if metrics.enabled:
+            # an f-string and a regex per request, only paid for when metrics are collected
+            request_name = f'{method.upper()} {endpoint_name(url)}'
+        breaker = self._circuit_breaker(url)
+        kwargs.setdefault('timeout', BACKEND_REQUEST_TIMEOUT)
+        allowed = False
+        try:
+            async with self._request_budget.slot(priority):
+                # checked once the slot is granted so that queued requests fail fast when the circuit opens meanwhile
+                allowed = breaker.allow()
+                if not allowed:
+                    if request_name:
+                        metrics.count(f'backend.fail_fast {breaker.host}')
+                    raise BackendNotAvailable()
+                started = time.perf_counter()
+                try:
+                    r = await loop.run_in_executor(self.executor, functools.partial(self.session.request, method, url, *args, **kwargs))
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    elapsed = time.perf_counter() - started
+                    if request_name:
+                        metrics.observe(f'backend.request {request_name}', elapsed)
+                        metrics.count(f'backend.error {request_name}')
+                    breaker.record_failure()
+                    self._adaptive_limit.record(elapsed, failed=True)
+                    raise
+                elapsed = time.perf_counter() - started
+                if request_name:
+                    metrics.observe(f'backend.request {request_name}', elapsed)
+                server_failed = r.status_code >= 500
+                if server_failed:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                self._adaptive_limit.record(elapsed, failed=server_failed)
+        except asyncio.CancelledError:
+            if allowed:
+                breaker.record_ignored()
+            raise
         log.info(f"{r.status_code}: response from endpoint {url}")
+        if request_name:
+            metrics.count(f'backend.status {r.status_code} {request_name}')
 
         if r.status_code in (HTTPStatus.UNAUTHORIZED, HTTPStatus.FORBIDDEN):
             raise AccessDenied()
@@ -48,15 +128,15 @@ class BackendClient(object):
         j = r.json()  # all ubi endpoints return jsons
         return j
 
-    async def _do_request_safe(self, method, url, *args, **kwargs):
+    async def _do_request_safe(self, method, url, *args, priority=RequestPriority.INTERACTIVE, **kwargs):
 
         async def _refresh_and_request():
             await self._refresh_ticket()
-            return await self._do_request(method, url, *args, **kwargs)
+            return await self._do_request(method, url, *args, priority=priority, **kwargs)
         
         if self.__refresh_in_progress:
             log.info(f'Refreshing already in progress. Calling to {url} without refresh')
-            return await self._do_request(method, url, *args, **kwargs)
+            return await self._do_request(method, url, *args, priority=priority, **kwargs)
 
         self.__refresh_in_progress = True
         result = {}
@@ -75,6 +155,7 @@ class BackendClient(object):
                     except AccessDenied:
                         # fallback for another reason than expired time or wrong calculation due to changing time zones
                         log.debug('Fallback refresh')
+                        metrics.count('backend.retries')
                         await self._refresh_remember_me()
                         result = await _refresh_and_request()
         except AccessDenied:
@@ -93,7 +174,7 @@ class BackendClient(object):
 
 
     async def _do_options_request(self):
-        await self._do_request('options', "https://public-ubiservices.ubi.com/v3/profiles/sessions", headers={
+        await self._do_request('options', "https://public-ubiservices.ubi.com/v3/profiles/sessions", priority=RequestPriority.AUTH, headers={
             "Origin": "https://connect.ubisoft.com",
             "Referer": "https://connect.ubisoft.com/login?appId=314d4fef-e568-454a-ae06-43e3bece12a6",
             "User-Agent": CHROME_USERAGENT,
@@ -105,6 +186,7 @@ class BackendClient(object):
         j = await self._do_request(
             'post',
             f'https://public-ubiservices.ubi.com/v3/profiles/sessions',
+            priority=RequestPriority.AUTH,
             headers={
                 'Accept': '*/*',
                 'Accept-Encoding': 'gzip, deflate, br',
@@ -127,6 +209,7 @@ class BackendClient(object):
         j = await self._do_request(
             'put',
             f'https://public-ubiservices.ubi.com/v3/profiles/sessions',
+            priority=RequestPriority.AUTH,
             headers={
                 'Accept': '*/*',
                 'Accept-Encoding': 'gzip, deflate, br',
@@ -142,6 +225,7 @@ class BackendClient(object):
         self._handle_authorization_response(j)
 
     def _handle_authorization_response(self, j):
+        import dateutil.parser
         refresh_time = datetime.now() + (dateutil.parser.parse(j['expiration']) - dateutil.parser.parse(j['serverTime']))
         j['refreshTime'] = round(refresh_time.timestamp())
         self.restore_credentials(j)
@@ -190,7 +274,8 @@ class BackendClient(object):
         return user_data
 
     async def get_user_data(self):
-        return await self._do_request_safe('get', f"https://public-ubiservices.ubi.com/v3/users/{self.user_id}")
+        return await self._do_request_safe('get', f"https://public-ubiservices.ubi.com/v3/users/{self.user_id}",
+                                           priority=RequestPriority.AUTH)
 
     async def get_friends(self):
         r = await self._do_request_safe('get', f'https://api-ubiservices.ubi.com/v2/profiles/me/friends')
@@ -212,7 +297,7 @@ class BackendClient(object):
             "User-Agent": CHROME_USERAGENT,
         }
         try:
-            j = await self._do_request('get', url, headers=headers)
+            j = await self._do_request('get', url, priority=RequestPriority.BACKGROUND, headers=headers)
         except UnknownError:  # 404 - no stats available
             return {}
         return j
@@ -222,8 +307,9 @@ class BackendClient(object):
         j = await self._do_request_safe('get', f"https://api-ubiservices.ubi.com/v2/applications?spaceIds={space_string}")
         return j
 
-    async def get_challenges(self, space_id):
-        j = await self._do_request_safe('get', f"https://public-ubiservices.ubi.com/v1/profiles/{self.user_id}/club/actions?limit=100&locale=en-US&spaceId={space_id}")
+    async def get_challenges(self, space_id, offset=0, limit=100, priority=RequestPriority.INTERACTIVE):
+        j = await self._do_request_safe('get', f"https://public-ubiservices.ubi.com/v1/profiles/{self.user_id}/club/actions?limit={limit}&offset={offset}&locale=en-US&spaceId={space_id}",
+                                        priority=priority)
         return j
 
     async def get_configuration(self):
@@ -233,5 +319,6 @@ class BackendClient(object):
     async def post_sessions(self):
         h = self.session.headers
         h['Content-Type'] = 'application/json'
-        j = await self._do_request_safe('post', f"https://public-ubiservices.ubi.com/v2/profiles/sessions", headers=h)
+        j = await self._do_request_safe('post', f"https://public-ubiservices.ubi.com/v2/profiles/sessions", headers=h,
+                                        priority=RequestPriority.AUTH)
         return j
@@ -0,0 +1,128 @@
+import asyncio
+import datetime
+import logging as log
+import time
+
+from galaxy.api.types import Achievement
+
+from consts import CHALLENGES_PAGE_SIZE, CHALLENGES_PREFETCH_INTERVAL
+from priority_budget import RequestPriority
+
+
+class _Fetch(object):
+    """Fetch of the challenges of one space, priority applies to the pages it hasn't requested yet"""
+    def __init__(self, priority):
+        self.priority = priority
+        self.pages = 0
+        self.started = time.time()
+        self.task = None
+
+
+class ChallengesCache(object):
+    """Keeps unlocked challenges per space id. A completed challenge can't become un-completed,
+    so once seen it is kept for good and only newly completed challenges get parsed.
+    A game with every challenge unlocked is refetched only once CHALLENGES_PREFETCH_INTERVAL passed,
+    a game update may add challenges to it."""
+    def __init__(self, backend_client):
+        self._client = backend_client
+        self._unlocked = {}
+        self._totals = {}
+        self._fetched_at = {}
+        self._pending = {}
+        self._last_prefetch = None
+
+    def _is_fully_unlocked(self, space_id):
+        total = self._totals.get(space_id)
+        if total is None or time.time() - self._fetched_at[space_id] > CHALLENGES_PREFETCH_INTERVAL:
+            return False
+        return len(self._unlocked.get(space_id, {})) >= total
+
+    async def _fetch_challenges(self, space_id, fetch):
+        offset = 0
+        while True:
+            page = await self._client.get_challenges(space_id, offset=offset, limit=CHALLENGES_PAGE_SIZE,
+                                                     priority=fetch.priority)
+            fetch.pages += 1
+            actions = page.get("actions", [])
+            for challenge in actions:
+                yield challenge
+            if len(actions) < CHALLENGES_PAGE_SIZE:
+                return
+            offset += len(actions)
+
+    async def _fetch_unlocked(self, space_id, fetch):
+        import dateutil.parser
+        unlocked = self._unlocked.setdefault(space_id, {})
+        if self._is_fully_unlocked(space_id):
+            log.debug(f"All challenges for {space_id} already unlocked, skipping request")
+            return list(unlocked.values())
+
+        total = 0
+        async for challenge in self._fetch_challenges(space_id, fetch):
+            if challenge["isBadge"]:
+                continue
+            total += 1
+            if not challenge["isCompleted"] or challenge["id"] in unlocked:
+                continue
+            unlocked[challenge["id"]] = Achievement(
+                achievement_id=challenge["id"],
+                achievement_name=challenge["name"],
+                unlock_time=int(datetime.datetime.timestamp(dateutil.parser.parse(challenge["completionDate"])))
+            )
+        self._totals[space_id] = total
+        self._fetched_at[space_id] = time.time()
+        return list(unlocked.values())
+
+    def _start_fetch(self, space_id, priority=RequestPriority.INTERACTIVE):
+        fetch = _Fetch(priority)
+        fetch.task = asyncio.ensure_future(self._fetch_unlocked(space_id, fetch))
+        fetch.task.add_done_callback(self._log_failed_fetch)
+        self._pending[space_id] = fetch
+        return fetch
+
+    def _usable_fetch(self, space_id):
+        """Fetch of the space still running or finished successfully within CHALLENGES_PREFETCH_INTERVAL"""
+        fetch = self._pending.get(space_id)
+        if fetch is None or not fetch.task.done():
+            return fetch
+        if fetch.task.cancelled() or fetch.task.exception() is not None \
+                or time.time() - fetch.started > CHALLENGES_PREFETCH_INTERVAL:
+            del self._pending[space_id]
+            return None
+        return fetch
+
+    @staticmethod
+    def _log_failed_fetch(task):
+        if not task.cancelled() and task.exception() is not None:
+            log.warning(f"Fetching challenges failed: {repr(task.exception())}")
+
+    @property
+    def prefetch_due(self):
+        return self._last_prefetch is None or time.time() - self._last_prefetch > CHALLENGES_PREFETCH_INTERVAL
+
+    def prefetch(self, space_ids):
+        """Starts fetching challenges of all given games at once. Requests are bounded by
+        the backend client request budget, results are handed out by get_unlocked."""
+        self._last_prefetch = time.time()
+        # results of the previous prefetch nobody asked for are refetched
+        self._pending = {space_id: fetch for space_id, fetch in self._pending.items() if not fetch.task.done()}
+        space_ids = [space_id for space_id in space_ids if space_id not in self._pending]
+        log.info(f"Prefetching challenges for {len(space_ids)} games")
+        for space_id in space_ids:
+            self._start_fetch(space_id, RequestPriority.BACKGROUND)
+
+    async def get_unlocked(self, space_id):
+        fetch = self._usable_fetch(space_id)
+        if fetch is not None and not fetch.task.done() and fetch.priority == RequestPriority.BACKGROUND:
+            # a game asked for now must not wait behind the rest of the prefetch
+            fetch.priority = RequestPriority.INTERACTIVE
+            if not fetch.pages:
+                # its first page may still be queued in the background class
+                fetch = None
+        if fetch is None:
+            fetch = self._start_fetch(space_id)
+        try:
+            return await asyncio.shield(fetch.task)
+        finally:
+            if fetch.task.done() and self._pending.get(space_id) is fetch:
+                del self._pending[space_id]
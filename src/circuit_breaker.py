@@ -0,0 +1,60 @@
+import enum
+import logging as log
+import time
+
+from consts import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+from metrics import metrics
+
+
+class CircuitState(enum.Enum):
+    Closed = 'closed'
+    Open = 'open'
+    HalfOpen = 'half-open'
+
+
+class CircuitBreaker(object):
+    """Stops sending requests to a host which keeps failing.
+    After failure_threshold consecutive failures the circuit opens and requests are refused for reset_timeout.
+    Then a single probe request is let through, its success closes the circuit and its failure opens it again."""
+    def __init__(self, host, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitState.Closed
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def _set_state(self, state):
+        if state != self.state:
+            log.info(f"Circuit of {self.host} {self.state.value} -> {state.value}")
+            metrics.count(f'backend.circuit {state.value} {self.host}')
+            self.state = state
+
+    def allow(self):
+        """Whether a request may be sent now, every allowed request has to be followed by record_* call"""
+        if self.state == CircuitState.Open:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._set_state(CircuitState.HalfOpen)
+        if self.state == CircuitState.HalfOpen:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self):
+        self._failures = 0
+        self._probing = False
+        self._set_state(CircuitState.Closed)
+
+    def record_failure(self):
+        self._failures += 1
+        self._probing = False
+        if self.state == CircuitState.HalfOpen or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(CircuitState.Open)
+
+    def record_ignored(self):
+        """Request ended in a way which tells nothing about the host health"""
+        self._probing = False
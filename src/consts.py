@@ -3,14 +3,80 @@ from definitions import System, SYSTEM
 from galaxy.api.types import Cookie
 UBISOFT_REGISTRY = "SOFTWARE\\Ubisoft"
 STEAM_REGISTRY = "Software\\Valve\\Steam"
+STEAM_REGISTRY_APPS = "Software\\Valve\\Steam\\Apps"
 UBISOFT_REGISTRY_LAUNCHER = "SOFTWARE\\Ubisoft\\Launcher"
 UBISOFT_REGISTRY_LAUNCHER_INSTALLS = "SOFTWARE\\Ubisoft\\Launcher\\Installs"
 
 if SYSTEM == System.WINDOWS:
     UBISOFT_SETTINGS_YAML = os.path.join(os.getenv('LOCALAPPDATA'), 'Ubisoft Game Launcher', 'settings.yml')
+    PLUGIN_DATA_PATH = os.path.join(os.getenv('LOCALAPPDATA'), 'GOG.com', 'Galaxy', 'plugins', 'data', 'uplay')
+else:
+    PLUGIN_DATA_PATH = os.path.join(os.path.expanduser('~'), 'Library', 'Application Support', 'GOG.com', 'Galaxy',
+                                    'plugins', 'data', 'uplay')
 
 UBISOFT_CONFIGURATIONS_BLACKLISTED_NAMES = ["gamename", "l1", '', 'ubisoft game', 'name']
 
+OWNERSHIP_HEADER_SIZE = 0x108
+
+CHALLENGES_PAGE_SIZE = 100
+CHALLENGES_PREFETCH_INTERVAL = 300
+
+MAX_REQUESTS_IN_FLIGHT = 10
+# seconds a queued request waits to be served like one of the next more important priority class
+REQUEST_PRIORITY_AGING = 30
+BACKEND_REQUEST_TIMEOUT = 30
+# requests in flight shrink down to the minimum while responses are slower than the target or fail
+ADAPTIVE_MIN_REQUESTS_IN_FLIGHT = 1
+ADAPTIVE_LATENCY_TARGET = 2
+# consecutive failures opening the circuit of a host, requests to it fail right away until the reset timeout passes
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30
+
+# defer heavy imports and local status watching until they are needed
+LAZY_INITIALIZATION = True
+
+METRICS_ENABLED = os.getenv('UPLAY_PLUGIN_METRICS') == '1'
+METRICS_REPORT_INTERVAL = 300
+
+# profiling starts when the environment variable is set or the marker file appears in the plugin data directory
+PROFILER_ENV_VARIABLE = 'UPLAY_PLUGIN_PROFILE'
+PROFILER_MARKER_FILE = 'profile'
+PROFILER_WINDOW = 30
+PROFILER_SAMPLE_INTERVAL = 0.01
+PROFILER_LAG_PROBE_INTERVAL = 0.05
+
+FRIENDS_CACHE_TTL = 600
+# delay before retrying a failed background friends refresh, doubled on every further failure up to the TTL
+FRIENDS_RETRY_BACKOFF = 30
+# last owned games and game times are answered right away while fresh ones are fetched, unless they are older than
+OWNED_GAMES_MAX_STALENESS = 3 * 24 * 60 * 60
+GAME_TIMES_MAX_STALENESS = 24 * 60 * 60
+# results younger than this are served without revalidation, e.g. right after the post-authentication prefetch
+REVALIDATE_AFTER = 60
+
+REGISTRY_CACHE_TTL = 1
+
+# wait for the launcher to finish writing its files before reparsing them
+LOCAL_FILES_REPARSE_DEBOUNCE = 2
+# threads reading launcher files and registry, kept apart from the pool used by backend requests
+LOCAL_IO_WORKERS = 2
+# games parsed from the configuration file per local io pool call, merged on the event loop between calls
+LOCAL_FILES_PARSE_BATCH = 100
+
+STATUS_POLL_INTERVAL = 1
+# used while install directories are watched and no game is running
+STATUS_POLL_INTERVAL_WATCHED = 10
+WATCH_INSTALL_DIRECTORIES = True
+# ReadDirectoryChangesBackend hasn't been run on Windows yet, statuses are polled every second there until it has
+WATCH_INSTALL_DIRECTORIES_WINDOWS = False
+# status changes kept for consumers, one that falls further behind gets every current status instead
+STATUS_CHANGES_RETAINED = 1000
+# local game status updates of one game within this many seconds are sent to Galaxy as one
+STATUS_NOTIFICATION_WINDOW = 1
+
+# time periodic jobs may take in a single tick, jobs which don't fit carry over to the next one
+TICK_BUDGET = 0.05
+
 CHROME_USERAGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/72.0.3626.121 Safari/537.36"
 CLUB_APPID = "f35adcb5-1911-440c-b1c9-48fdc1701c68"
 CLUB_GENOME_ID = "8ec37540-95c5-4a46-9174-86e04b8630cb"
@@ -2,7 +2,6 @@ import sys
 from dataclasses import dataclass
 from enum import EnumMeta
 from typing import Optional
-import psutil as psutil
 
 from galaxy.api.types import LocalGameState, LocalGame, Game, LicenseInfo, LicenseType
 
@@ -17,6 +16,8 @@ if sys.platform == 'win32':
     SYSTEM = System.WINDOWS
 elif sys.platform == 'darwin':
     SYSTEM = System.MACOS
+else:
+    SYSTEM = System.LINUX
 
 
 class GameType(EnumMeta):
@@ -74,7 +75,7 @@ class UbisoftGame(object):
 
 @dataclass
 class WatchedProcess(object):
-    process: psutil.Process
+    process: 'psutil.Process'
     timeout: float
     type: ProcessType
     game: Optional[UbisoftGame]
@@ -0,0 +1,85 @@
+import logging as log
+import time
+
+from galaxy.api.types import FriendInfo
+
+from consts import FRIENDS_CACHE_TTL, FRIENDS_RETRY_BACKOFF
+from single_flight import SingleFlight
+from storage import load_snapshot, save_snapshot
+
+
+class FriendsCache(object):
+    """Friends list kept for FRIENDS_CACHE_TTL seconds. The last fetched list is persisted
+    so that a restarted plugin can answer without a round-trip."""
+    def __init__(self, backend_client, ttl=FRIENDS_CACHE_TTL):
+        self._client = backend_client
+        self._ttl = ttl
+        self._friends = None
+        self._fetched_at = None
+        self._failures = 0
+        self._retry_at = None
+        self._single_flight = SingleFlight()
+        self._snapshot_name = None
+
+    def restore(self, user_id):
+        """Switches to the user's persisted list, nothing of a previous user survives"""
+        self._snapshot_name = f"friends_{user_id}"
+        self._forget()
+        snapshot = load_snapshot(self._snapshot_name)
+        if snapshot:
+            try:
+                self._friends = dict(snapshot['friends'])
+                self._fetched_at = snapshot['fetched_at']
+                log.info(f"Restored {len(self._friends)} friends from snapshot")
+            except Exception as e:
+                self._forget()
+                log.warning(f"Unable to restore friends snapshot {repr(e)}")
+
+    def _forget(self):
+        self._friends = None
+        self._fetched_at = None
+
+    @property
+    def expired(self):
+        return self._fetched_at is None or time.time() - self._fetched_at > self._ttl
+
+    @property
+    def refresh_due(self):
+        """Expired and not backing off after failed refreshes"""
+        return self.expired and (self._retry_at is None or time.time() >= self._retry_at)
+
+    @property
+    def refreshing(self):
+        return self._single_flight.in_flight('refresh')
+
+    async def get_friends(self):
+        if self.expired:
+            await self.refresh()
+        return [FriendInfo(user_id=user_id, user_name=user_name) for user_id, user_name in self._friends.items()]
+
+    async def refresh(self):
+        """Fetches the friends list, concurrent callers share a single request.
+        Returns friends added and user ids removed since the previous list."""
+        return await self._single_flight.run('refresh', self._refresh)
+
+    async def _refresh(self):
+        try:
+            response = await self._client.get_friends()
+        except Exception:
+            self._failures += 1
+            self._retry_at = time.time() + min(self._ttl, FRIENDS_RETRY_BACKOFF * 2 ** (self._failures - 1))
+            raise
+        self._failures = 0
+        self._retry_at = None
+        friends = {friend["pid"]: friend["nameOnPlatform"] for friend in response["friends"]}
+        previous = self._friends or {}
+
+        added = [FriendInfo(user_id=user_id, user_name=user_name)
+                 for user_id, user_name in friends.items() if user_id not in previous]
+        removed = [user_id for user_id in previous if user_id not in friends]
+
+        self._friends = friends
+        self._fetched_at = time.time()
+        if self._snapshot_name:
+            save_snapshot(self._snapshot_name, {'fetched_at': self._fetched_at, 'friends': friends})
+        return added, removed
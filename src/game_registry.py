@@ -0,0 +1,64 @@
+import logging as log
+from threading import Lock
+
+from metrics import metrics
+
+
+class GameRegistry(object):
+    """Owns the lifetime of per-game state kept by plugin subsystems.
+    Subsystems register an eviction callback and acquire launch ids of games they keep state for,
+    once a game vanishes from the local files retain evicts it from every subsystem holding it.
+    Subsystems are used from the event loop and the status thread, so holders are guarded by a lock."""
+    def __init__(self):
+        self._evictors = {}
+        self._holders = {}
+        self._lock = Lock()
+
+    def register(self, subsystem, evict):
+        """evict(launch_id) drops every state the subsystem keeps for the game"""
+        self._evictors[subsystem] = evict
+
+    def acquire(self, launch_id, subsystem):
+        if not launch_id:
+            return
+        with self._lock:
+            self._holders.setdefault(launch_id, set()).add(subsystem)
+
+    def release(self, launch_id, subsystem):
+        """Called by a subsystem which dropped the state of a game on its own"""
+        with self._lock:
+            holders = self._holders.get(launch_id)
+            if holders is None:
+                return
+            holders.discard(subsystem)
+            if not holders:
+                del self._holders[launch_id]
+
+    def holders(self, launch_id):
+        with self._lock:
+            return set(self._holders.get(launch_id, ()))
+
+    def __contains__(self, launch_id):
+        return launch_id in self._holders
+
+    def __len__(self):
+        return len(self._holders)
+
+    def evict(self, launch_id):
+        with self._lock:
+            holders = self._holders.pop(launch_id, set())
+        for subsystem in holders:
+            try:
+                self._evictors[subsystem](launch_id)
+            except Exception as e:
+                log.error(f"Evicting game {launch_id} from {subsystem} failed {repr(e)}")
+        metrics.count('registry.evicted')
+
+    def retain(self, launch_ids):
+        """Evicts every game whose launch id is not in launch_ids, returns the evicted launch ids"""
+        with self._lock:
+            vanished = [launch_id for launch_id in self._holders if launch_id not in launch_ids]
+        for launch_id in vanished:
+            log.info(f"Game {launch_id} vanished from local files, evicting its state")
+            self.evict(launch_id)
+        return vanished
@@ -3,6 +3,32 @@ from definitions import GameStatus
 
 
 class GamesCollection(list):
+    """Games known to the plugin, merged by space id and launch id.
+    Both ids are indexed so merging a game or looking one up doesn't scan the collection."""
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._by_space_id = {}
+        self._by_launch_id = {}
+        # bumped whenever a game is added or an entry changes, lets callers skip passes over an unchanged collection
+        self.version = 0
+        for game in self:
+            self._index(game)
+
+    def _index(self, game):
+        if game.space_id:
+            self._by_space_id.setdefault(game.space_id, game)
+        if game.launch_id:
+            self._by_launch_id.setdefault(game.launch_id, game)
+
+    def _unindex(self, game):
+        if self._by_space_id.get(game.space_id) is game:
+            del self._by_space_id[game.space_id]
+        if self._by_launch_id.get(game.launch_id) is game:
+            del self._by_launch_id[game.launch_id]
+
+    def get(self, game_id):
+        """Returns game with given space id or launch id, None if unknown"""
+        return self._by_space_id.get(game_id) or self._by_launch_id.get(game_id)
 
     def get_local_games(self):
         local_games = []
@@ -11,28 +37,57 @@ class GamesCollection(list):
                 local_games.append(game)
         return local_games
 
-    def append(self, games):
-        spaces = set([game.space_id for game in self if game.space_id])
-        launches = set([game.launch_id for game in self if game.launch_id])
-
+    def merge(self, games):
+        """Merges games one at a time as they come, yielding the collection entry each of them ended up in"""
         for game in games:
-            if game.space_id not in spaces and game.launch_id not in launches:
+            game_in_list = None
+            if game.space_id:
+                game_in_list = self._by_space_id.get(game.space_id)
+            if game_in_list is None and game.launch_id:
+                game_in_list = self._by_launch_id.get(game.launch_id)
+
+            if game_in_list is None:
                 super().append(game)
+                self._index(game)
+                self.version += 1
+                yield game
                 continue
-            if game.space_id in spaces or game.launch_id in launches:
-                for game_in_list in self:
-                    if game.space_id == game_in_list.space_id or game.launch_id == game_in_list.launch_id:
-                        if game.launch_id and not game_in_list.launch_id:
-                            log.debug(f"Extending existing game entry {game_in_list} with launch id: {game.launch_id}")
-                            game_in_list.launch_id = game.launch_id
-                        if game.space_id and not game_in_list.space_id:
-                            log.debug(f"Extending existing game entry {game_in_list} with space id: {game.space_id}")
-                            game_in_list.space_id = game.space_id
-                        if game.status is not GameStatus.Unknown and game_in_list.status is GameStatus.Unknown:
-                            game_in_list.status = game.status
-                        if game.owned:
-                            game_in_list.owned = game.owned
 
+            changed = False
+            if game.launch_id and not game_in_list.launch_id:
+                log.debug(f"Extending existing game entry {game_in_list} with launch id: {game.launch_id}")
+                game_in_list.launch_id = game.launch_id
+                changed = True
+            if game.space_id and not game_in_list.space_id:
+                log.debug(f"Extending existing game entry {game_in_list} with space id: {game.space_id}")
+                game_in_list.space_id = game.space_id
+                changed = True
+            if game.status is not GameStatus.Unknown and game_in_list.status is GameStatus.Unknown:
+                game_in_list.status = game.status
+                changed = True
+            if game.owned and not game_in_list.owned:
+                game_in_list.owned = game.owned
+                changed = True
+            if changed:
+                self._index(game_in_list)
+                self.version += 1
+            yield game_in_list
 
+    def append(self, games):
+        for _ in self.merge(games):
+            pass
 
+    def discard(self, game):
+        """Removes the game entry, returns the index it had"""
+        index = next(i for i, game_in_list in enumerate(self) if game_in_list is game)
+        del self[index]
+        self._unindex(game)
+        self.version += 1
+        return index
 
+    def detach_launch_id(self, game):
+        """Forgets launch id of a game which is no longer in the local files but stays known by its space id"""
+        if self._by_launch_id.get(game.launch_id) is game:
+            del self._by_launch_id[game.launch_id]
+        game.launch_id = ''
+        self.version += 1
@@ -1,38 +1,33 @@
+import itertools
 import os
 import time
 import logging as log
-import math
 import re
+import stat
 
-from threading import Thread
-
-import psutil as psutil
-import yaml
+from collections import deque
+from threading import Thread, Event, Lock
 
 from definitions import UbisoftGame, GameType, GameStatus, ProcessType, WatchedProcess, SYSTEM, System
 
 from consts import UBISOFT_REGISTRY_LAUNCHER, UBISOFT_REGISTRY_LAUNCHER_INSTALLS, \
-    UBISOFT_CONFIGURATIONS_BLACKLISTED_NAMES
+    UBISOFT_CONFIGURATIONS_BLACKLISTED_NAMES, STATUS_POLL_INTERVAL, STATUS_POLL_INTERVAL_WATCHED, \
+    OWNERSHIP_HEADER_SIZE, STATUS_CHANGES_RETAINED, LOCAL_FILES_PARSE_BATCH
 
 from steam import get_steam_game_status
-
-if SYSTEM == System.WINDOWS:
-    import winreg
-
-
-def _get_registry_value_from_path(top_key, registry_path, key):
-    with winreg.OpenKey(top_key, registry_path, 0, winreg.KEY_READ) as winkey:
-        return winreg.QueryValueEx(winkey, key)[0]
+from registry import registry, HKEY_LOCAL_MACHINE
+from watcher import create_install_watcher
+from game_registry import GameRegistry
+from metrics import metrics
 
 
 def _return_local_game_path_from_special_registry(special_registry_path):
     if not special_registry_path:
         return GameStatus.NotInstalled
     try:
-        install_location = _get_registry_value_from_path(winreg.HKEY_LOCAL_MACHINE, special_registry_path,
-                                                         "InstallLocation")
+        install_location = registry.get_value(HKEY_LOCAL_MACHINE, special_registry_path, "InstallLocation")
         return install_location
-    except WindowsError:
+    except OSError:
         # Entry doesn't exist, game is not installed.
         return ""
     except Exception as e:
@@ -41,17 +36,14 @@ def _return_local_game_path_from_special_registry(special_registry_path):
 
 
 def _return_local_game_path(launch_id):
-    installs_path = UBISOFT_REGISTRY_LAUNCHER_INSTALLS
     try:
-        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, installs_path):
-            try:
-                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, installs_path + f'\\{launch_id}') as lkey:
-                    game_path, _ = winreg.QueryValueEx(lkey, 'InstallDir')
-                    return os.path.normcase(os.path.normpath(game_path))
-            except OSError:
-                return ""  # end of iteration
-    except WindowsError:
+        installs = registry.get_subkeys(HKEY_LOCAL_MACHINE, UBISOFT_REGISTRY_LAUNCHER_INSTALLS)
+    except OSError:
+        return ""  # No games installed
+    game_path = installs.get(str(launch_id), {}).get('InstallDir')
+    if not game_path:
         return ""  # Game not installed / during installation
+    return os.path.normcase(os.path.normpath(game_path))
 
 
 def _smart_return_local_game_path(special_registry_path, launch_id):
@@ -62,52 +54,68 @@ def _smart_return_local_game_path(special_registry_path, launch_id):
 
 
 def _is_file_at_path(path, file):
-    if os.path.isdir(path):
-        file_location = os.path.join(path, file)
-        if os.path.isfile(file_location):
-            return True
-        return False
-    else:
+    try:
+        return stat.S_ISREG(os.stat(os.path.join(path, file)).st_mode)
+    except OSError:
         return False
 
 
-def _read_status_from_state_file(game_path):
-    try:
-        if os.path.exists(os.path.join(game_path, 'uplay_install.state')):
-            with open(os.path.join(game_path, 'uplay_install.state'), 'rb') as f:
-                if f.read()[0] == 0x0A:
-                    return GameStatus.Installed
-                else:
-                    return GameStatus.NotInstalled
-        # State file doesn't exit
-        else:
+class InstallStateCache(object):
+    """Install statuses read from uplay_install.state files. Each check costs a single stat,
+    the state file itself is only reread when its modification time or size changes."""
+    def __init__(self):
+        self._states = {}
+
+    def _read_status_from_state_file(self, state_path, signature):
+        cached = self._states.get(state_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        try:
+            with open(state_path, 'rb') as f:
+                status = GameStatus.Installed if f.read(1) == b'\x0a' else GameStatus.NotInstalled
+        except Exception as e:
+            log.warning(f"Issue reading install state file {state_path}: {repr(e)}")
+            status = GameStatus.NotInstalled
+        self._states[state_path] = (signature, status)
+        return status
+
+    def get_status(self, path, exe=None, special_registry_path=None):
+        if not path:
             return GameStatus.NotInstalled
-    except Exception as e:
-        log.warning(f"Issue reading install state file for {game_path}: {repr(e)}")
-        return GameStatus.NotInstalled
+        state_path = os.path.join(path, 'uplay_install.state')
+        try:
+            state_stat = os.stat(state_path)
+        except OSError:
+            # Game directory or state file doesn't exist
+            self._states.pop(state_path, None)
+            status = GameStatus.NotInstalled
+        else:
+            status = self._read_status_from_state_file(state_path, (state_stat.st_mtime_ns, state_stat.st_size))
+        # Fallback for old games
+        if status == GameStatus.NotInstalled and exe and special_registry_path:
+            if _is_file_at_path(path, exe):
+                status = GameStatus.Installed
+        return status
+
+
+install_state_cache = InstallStateCache()
 
 
 def _return_game_installed_status(path, exe=None, special_registry_path=None):
-    status = GameStatus.NotInstalled
     try:
-        if path and os.access(path, os.F_OK):
-            status = _read_status_from_state_file(path)
-            # Fallback for old games
-            if status == GameStatus.NotInstalled and exe and special_registry_path:
-                if _is_file_at_path(path, exe):
-                    status = GameStatus.Installed
+        return install_state_cache.get_status(path, exe, special_registry_path)
     except Exception as e:
         log.error(f"Error reading game installed status at {path}: {repr(e)}")
-    finally:
-        return status
+        return GameStatus.NotInstalled
 
 
 class LocalClient(object):
     def __init__(self):
-        self.last_modification_times = None
+        self.file_signatures = {}
         self.configurations_path = None
         self.ownership_path = None
         self.launcher_log_path = None
+        self.launcher_cache_path = None
         self.user_id = None
         self._is_installed = None
         self.refresh()
@@ -116,8 +124,8 @@ class LocalClient(object):
         log.info('Setting user id:' + user_id)
         self.user_id = user_id
         self.refresh()
-        # Start tracking ownership file if exists
-        self.ownership_changed()
+        # Start tracking ownership and configurations files if exist
+        self.local_files_changed()
 
     def ownership_accesible(self):
         if self.ownership_path is None:
@@ -156,10 +164,8 @@ class LocalClient(object):
 
     def _find_windows_client(self):
         try:
-            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, UBISOFT_REGISTRY_LAUNCHER, 0,
-                                winreg.KEY_READ) as key:
-                directory, _ = winreg.QueryValueEx(key, "InstallDir")
-                return os.access(directory, os.F_OK), directory
+            directory = registry.get_value(HKEY_LOCAL_MACHINE, UBISOFT_REGISTRY_LAUNCHER, "InstallDir")
+            return os.access(directory, os.F_OK), directory
         except OSError:
             return False, ''
 
@@ -174,6 +180,7 @@ class LocalClient(object):
                 self._is_installed = True
             self.configurations_path = os.path.join(path, "cache", "configuration", "configurations")
             self.launcher_log_path = os.path.join(path, "logs", "launcher_log.txt")
+            self.launcher_cache_path = os.path.join(path, "cache")
             if self.user_id is not None:
                 self.ownership_path = os.path.join(path, "cache", "ownership", self.user_id)
         else:
@@ -183,30 +190,49 @@ class LocalClient(object):
             self.configurations_path = None
             self.ownership_path = None
             self.launcher_log_path = None
+            self.launcher_cache_path = None
 
-    def ownership_changed(self):
+    def _file_changed(self, path):
+        file_stat = os.stat(path)
+        signature = (file_stat.st_mtime, file_stat.st_size, file_stat.st_ino)
+        if signature != self.file_signatures.get(path):
+            self.file_signatures[path] = signature
+            return True
+        return False
+
+    def local_files_changed(self):
+        """Whether ownership or configurations file was created or modified since the last call"""
         path = self.ownership_path
         try:
-            stat = os.stat(path)
+            ownership_changed = self._file_changed(path)
         except TypeError:
             log.warning(f'Undecided Ownership file path, uplay client might not be installed')
             self.refresh()
+            return False
         except FileNotFoundError:
             log.warning(f'Ownership file at {path} path not present, user never logged in to uplay client.')
             self.refresh()
+            return False
         except Exception as e:
             log.exception(f'Stating {path} has failed: {str(e)}')
             self.refresh()
-        else:
-            if stat.st_mtime != self.last_modification_times:
-                self.last_modification_times = stat.st_mtime
-                return True
-        return False
+            return False
+
+        try:
+            configurations_changed = self._file_changed(self.configurations_path)
+        except (TypeError, OSError):
+            configurations_changed = False
+        return ownership_changed or configurations_changed
 
 
 class ProcessWatcher(object):
-    def __init__(self):
+    """Processes are watched and probed on the status thread, games are forgotten on the event loop.
+    watched_processes is only ever replaced under the lock, so it can be iterated without it."""
+    def __init__(self, registry=None):
         self.watched_processes = []
+        self._lock = Lock()
+        self.registry = registry if registry is not None else GameRegistry()
+        self.registry.register('process_watcher', self.forget_game)
 
     def watch_process(self, proces, game=None):
         try:
@@ -216,30 +242,71 @@ class ProcessWatcher(object):
                 type=ProcessType.Game if game else ProcessType.Launcher,
                 game=game if game else None,
             )
-            self.watched_processes.append(process)
+            with self._lock:
+                self.watched_processes = self.watched_processes + [process]
+            if game:
+                self.registry.acquire(game.launch_id, 'process_watcher')
             return process
         except:
             return None
 
+    def _watched_games(self):
+        return {proc.game.launch_id for proc in self.watched_processes if proc.game}
+
     def update_watched_processes_list(self):
         try:
+            stopped = []
             for proc in self.watched_processes:
                 if not proc.process.is_running():
                     log.info(f"Removing {proc}")
-                    self.watched_processes.remove(proc)
+                    stopped.append(proc)
+            if not stopped:
+                return
+            with self._lock:
+                # processes are probed without the lock, a game forgotten meanwhile must stay forgotten
+                ended = self._watched_games()
+                self.watched_processes = [proc for proc in self.watched_processes if proc not in stopped]
+                ended -= self._watched_games()
+            for launch_id in ended:
+                self.registry.release(launch_id, 'process_watcher')
         except Exception as e:
             log.error(f"Error removing process from watched processes list {repr(e)}")
 
+    def forget_game(self, launch_id):
+        with self._lock:
+            self.watched_processes = [proc for proc in self.watched_processes
+                                      if not proc.game or proc.game.launch_id != launch_id]
+
 
 class GameStatusNotifier(object):
-    def __init__(self, process_watcher):
+    """Probes statuses of tracked games in a thread.
+    Every status change is recorded with a generation number, so consumers can fetch just the changes they haven't seen."""
+    def __init__(self, process_watcher, registry=None):
         self.process_watcher = process_watcher
+        self.registry = registry if registry is not None else process_watcher.registry
+        self.registry.register('status_notifier', self.forget_game)
         self.games = {}
         self.watchers = {}
         self.statuses = {}
+        self.generation = 0
+        self._changes = deque(maxlen=STATUS_CHANGES_RETAINED)
+        self._changes_lock = Lock()
         self.launcher_log_path = None
+        self.launcher_cache_path = None
+        self._launcher_cache_dirs = (None, [])
+        self._wake = Event()
+        self._watcher = None
+        self.thread = None
+        self.started = False
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        self._watcher = create_install_watcher(self._on_paths_changed)
         if SYSTEM == System.WINDOWS:
-            Thread(target=self._process_data, daemon=True).start()
+            self.thread = Thread(target=self._process_data, daemon=True)
+            self.thread.start()
 
     def update_game(self, game: UbisoftGame):
 
@@ -248,6 +315,13 @@ class GameStatusNotifier(object):
                 return
 
         self.games[game.launch_id] = game
+        self.registry.acquire(game.launch_id, 'status_notifier')
+
+    def forget_game(self, launch_id):
+        with self._changes_lock:
+            self.games.pop(launch_id, None)
+            self.watchers.pop(launch_id, None)
+            self.statuses.pop(launch_id, None)
 
     def _is_process_alive(self, game):
         try:
@@ -271,6 +345,7 @@ class GameStatusNotifier(object):
                     pid = int(
                         re.search('Game with process id ([-+]?[0-9]+) has been started', line_list[line]).group(1))
                     if pid:
+                        import psutil
                         self.process_watcher.watch_process(psutil.Process(pid), game)
                         return True
                 line = line - 1
@@ -282,7 +357,7 @@ class GameStatusNotifier(object):
 
     def _is_game_running(self, game, line_list):
         try:
-            if self.statuses[game.launch_id] == GameStatus.Running:
+            if self.statuses.get(game.launch_id) == GameStatus.Running:
                 return self._is_process_alive(game)
             else:
                 return self._parse_log(game, line_list)
@@ -293,7 +368,7 @@ class GameStatusNotifier(object):
         line_list = []
         if self.launcher_log_path:
             try:
-                with open(self.launcher_log_path, "r") as fh:
+                with metrics.timer('status.log_tail'), open(self.launcher_log_path, "r") as fh:
                     line_list = fh.readlines()
                     line_list = line_list[-number_of_lines:]
             except FileNotFoundError:
@@ -303,31 +378,129 @@ class GameStatusNotifier(object):
                     f"Can't read launcher log at {self.launcher_log_path}, unable to read running games statuses: {repr(e)}")
         return line_list
 
-    def _process_data(self):
-        statuses = {}
-        while True:
-            line_list = self._get_launcher_log_lines(50)
-            try:
-                for launch_id, game in self.games.items():
+    def _on_paths_changed(self, paths):
+        log.debug(f"Changes detected in {paths}")
+        self._wake.set()
+
+    def _get_launcher_cache_dirs(self):
+        cache_path, dirs = self._launcher_cache_dirs
+        if cache_path != self.launcher_cache_path:
+            dirs = []
+            if self.launcher_cache_path:
+                dirs = [directory for directory, _, _ in os.walk(self.launcher_cache_path)]
+            self._launcher_cache_dirs = (self.launcher_cache_path, dirs)
+        return dirs
+
+    def _get_watched_paths(self):
+        """Directories to watch and directory trees to watch with everything below them"""
+        paths = set()
+        trees = set()
+        if self._watcher.watches_subtrees:
+            # one watch for the whole launcher cache instead of one per directory
+            trees.add(self.launcher_cache_path)
+        else:
+            paths.update(self._get_launcher_cache_dirs())
+        if self.launcher_log_path:
+            paths.add(os.path.dirname(self.launcher_log_path))
+        for game in list(self.games.values()):
+            if game.type != GameType.Steam and game.path:
+                paths.add(game.path)
+        return paths, trees
+
+    def _wait_for_next_cycle(self, statuses):
+        time.sleep(STATUS_POLL_INTERVAL)
+        if self._watcher is not None:
+            self._watcher.sync(*self._get_watched_paths())
+            # Processes of running games can only be polled
+            if GameStatus.Running not in statuses.values():
+                self._wake.wait(STATUS_POLL_INTERVAL_WATCHED - STATUS_POLL_INTERVAL)
+        self._wake.clear()
+
+    def _set_status(self, statuses, launch_id, status):
+        old_status = statuses.get(launch_id)
+        if old_status == status:
+            return
+        with self._changes_lock:
+            if launch_id not in self.games:
+                return  # evicted while it was being probed
+            statuses[launch_id] = status
+            self.generation += 1
+            self._changes.append((launch_id, old_status, status, self.generation))
+
+    def changes_since(self, generation):
+        """Returns (launch_id, old_status, new_status, generation) records newer than generation
+        and the generation to pass next time. A consumer which fell behind the retained records
+        gets every current status instead."""
+        with self._changes_lock:
+            missed = self.generation - generation
+            if missed <= 0:
+                return [], self.generation
+            if missed > len(self._changes):
+                return [(launch_id, None, status, self.generation) for launch_id, status in self.statuses.items()], \
+                    self.generation
+            return [self._changes[i] for i in range(-missed, 0)], self.generation
+
+    def _update_statuses(self, statuses):
+        """Single status cycle, probes every game and records its status in statuses"""
+        line_list = self._get_launcher_log_lines(50)
+        self.statuses = statuses
+        try:
+            with metrics.timer('status.cycle'):
+                for launch_id, game in list(self.games.items()):
 
                     if game.type == GameType.Steam:
-                        statuses[launch_id] = get_steam_game_status(game.path)
+                        self._set_status(statuses, launch_id, get_steam_game_status(game.path))
                         continue
                     else:
                         if not game.path:
                             game.path = _smart_return_local_game_path(game.special_registry_path, game.launch_id)
 
-                        statuses[launch_id] = _return_game_installed_status(game.path, game.exe, game.special_registry_path)
+                        status = _return_game_installed_status(game.path, game.exe, game.special_registry_path)
 
-                    if statuses[launch_id] == GameStatus.Installed:
+                    if status == GameStatus.Installed:
                         if self._is_game_running(game, line_list):
-                            statuses[launch_id] = GameStatus.Running
+                            status = GameStatus.Running
+                    self._set_status(statuses, launch_id, status)
 
-            except Exception as e:
-                log.error(f"Process data error {repr(e)}")
-            finally:
-                time.sleep(1)
-            self.statuses = statuses
+        except Exception as e:
+            log.error(f"Process data error {repr(e)}")
+
+    def _process_data(self):
+        statuses = {}
+        while True:
+            self._update_statuses(statuses)
+            self._wait_for_next_cycle(statuses)
+
+
+def _read_varint(buffer, offset):
+    """Decodes a protobuf varint at offset, returns the value and offset of the following byte"""
+    byte = buffer[offset]
+    if byte < 0x80:
+        return byte, offset + 1
+    result = 0
+    shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, offset
+        shift += 7
+        if shift >= 64:
+            raise ValueError(f"varint too long at {offset}")
+
+
+def _skip_field(buffer, offset, wire_type):
+    if wire_type == 0:
+        return _read_varint(buffer, offset)[1]
+    if wire_type == 1:
+        return offset + 8
+    if wire_type == 2:
+        size, offset = _read_varint(buffer, offset)
+        return offset + size
+    if wire_type == 5:
+        return offset + 4
+    raise ValueError(f"unsupported wire type {wire_type} at {offset}")
 
 
 class LocalParser(object):
@@ -336,146 +509,84 @@ class LocalParser(object):
         self.ownership_raw = None
         self.parsed_games = None
 
-    def _convert_data(self, data):
-        # calculate object size (konrad's formula)
-        if data > 256 * 256:
-            data = data - (128 * 256 * math.ceil(data / (256 * 256)))
-            data = data - (128 * math.ceil(data / 256))
-        else:
-            if data > 256:
-                data = data - (128 * math.ceil(data / 256))
-        return data
-
-    def _parse_configuration_header(self, header, second_eight=False):
-        offset = 1
-        multiplier = 1
-        record_size = 0
-        tmp_size = 0
-
-        if second_eight:
-            while header[offset] != 0x08 or (header[offset] == 0x08 and header[offset + 1] == 0x08):
-                record_size += header[offset] * multiplier
-                multiplier *= 256
-                offset += 1
-                tmp_size += 1
-        else:
-            while header[offset] != 0x08 or record_size == 0:
-                record_size += header[offset] * multiplier
-                multiplier *= 256
-                offset += 1
-                tmp_size += 1
-
-        record_size = self._convert_data(record_size)
-
-        offset += 1  # skip 0x08
-
-        # look for launch_id
-        multiplier = 1
-        launch_id = 0
-
-        while header[offset] != 0x10 or header[offset + 1] == 0x10:
-            launch_id += header[offset] * multiplier
-            multiplier *= 256
-            offset += 1
-
-        launch_id = self._convert_data(launch_id)
-
-        offset += 1  # skip 0x10
-
-        while header[offset] != 0x1A or (header[offset] == 0x1A and header[offset + 1] == 0x1A):
-            offset += 1
-
-        # if object size is smaller than 128b, there might be a chance that secondary size will not occupy 2b
-        if record_size - offset < 128 <= record_size:
-            tmp_size -= 1
-            record_size += 1
-
-        # we end up in the middle of header, return values normalized
-        # to end of record as well real yaml size and game launch_id
-        return record_size - offset, launch_id, offset + tmp_size + 1
-
-    def _parse_ownership_header(self, header):
-        offset = 1
-        multiplier = 1
-        record_size = 0
-        tmp_size = 0
-        if header[offset - 1] == 0x0a:
-            while header[offset] != 0x08 or record_size == 0:
-                record_size += header[offset] * multiplier
-                multiplier *= 256
-                offset += 1
-                tmp_size += 1
-
-            record_size = self._convert_data(record_size)
-
-            offset += 1  # skip 0x08
-
-            # look for launch_id
-            multiplier = 1
-            launch_id = 0
-
-            while header[offset] != 0x10 or header[offset + 1] == 0x10:
-                launch_id += header[offset] * multiplier
-                multiplier *= 256
-                offset += 1
-
-            launch_id = self._convert_data(launch_id)
-
-            offset += 1  # skip 0x10
-
-            multiplier = 1
-            launch_id_2 = 0
-            while header[offset] != 0x22:
-                launch_id_2 += header[offset] * multiplier
-                multiplier *= 256
-                offset += 1
-
-            launch_id_2 = self._convert_data(launch_id_2)
-            return launch_id, launch_id_2, record_size + tmp_size + 1
-        else:
-            return None, None, None
-
-    def _parse_configuration(self):
-        configuration_content = self.configuration_raw
-        global_offset = 0
-        records = {}
+    def _iter_configuration_records(self):
+        """Configuration file is a protobuf stream of length-delimited records (field 1), each holding
+        the launch id in field 1 and the game yaml in field 3. Yields launch id and yaml bytes of every record
+        without copying them out of the file content."""
+        buffer = memoryview(self.configuration_raw)
+        buffer_size = len(buffer)
+        offset = 0
         try:
-            while global_offset < len(configuration_content):
-                data = configuration_content[global_offset:]
-                object_size, launch_id, header_size = self._parse_configuration_header(data)
-
-                record = {'size': object_size, 'offset': global_offset + header_size}
-                records[launch_id] = record
-
-                global_offset_tmp = global_offset
-                global_offset += object_size + header_size
-
-                if global_offset < len(configuration_content) and configuration_content[global_offset] != 0x0A:
-                    object_size, launch_id, header_size = self._parse_configuration_header(data, True)
-                    global_offset = global_offset_tmp + object_size + header_size
-        except:
-            log.exception("parse_configuration failed with exception. Possibly 'configuration' file corrupted")
-            return {}
-        return records
+            while offset < buffer_size:
+                if buffer[offset] != 0x0A:
+                    raise ValueError(f"unexpected record tag at {offset}")
+                record_size, offset = _read_varint(buffer, offset + 1)
+                record_end = offset + record_size
+                if record_end > buffer_size:
+                    raise ValueError(f"record at {offset} exceeds file size")
+
+                launch_id = None
+                stream = None
+                while offset < record_end:
+                    tag, offset = _read_varint(buffer, offset)
+                    if tag == 0x08:
+                        launch_id, offset = _read_varint(buffer, offset)
+                    elif tag == 0x1A:
+                        stream_size, offset = _read_varint(buffer, offset)
+                        stream = buffer[offset:offset + stream_size]
+                        offset += stream_size
+                    else:
+                        offset = _skip_field(buffer, offset, tag & 0x07)
+                if offset != record_end:
+                    raise ValueError(f"record field crosses record boundary at {offset}")
+
+                if launch_id is not None and stream:
+                    yield launch_id, stream
+        except (ValueError, IndexError) as e:
+            log.warning(f"Configuration file corrupted, stopped parsing at {offset}: {repr(e)}")
+
+    @staticmethod
+    def _iter_game_yamls(records):
+        import yaml
+        for launch_id, stream in records:
+            stream = str(stream, "utf8", errors='ignore')
+            if 'start_game' in stream:
+                with metrics.timer('local.yaml_load'):
+                    yaml_object = yaml.load(stream, Loader=yaml.FullLoader)
+                yield launch_id, yaml_object
 
     def _parse_ownership(self):
-        ownership_content = self.ownership_raw
-        global_offset = 0x108
-        records = []
+        """Ownership file is a protobuf stream of length-delimited records (field 1) following a fixed size header.
+        Each record holds the launch id in field 1 and a secondary launch id in field 2."""
+        buffer = self.ownership_raw
+        buffer_size = len(buffer)
+        offset = OWNERSHIP_HEADER_SIZE
+        records = set()
         try:
-            while global_offset < len(ownership_content):
-                data = ownership_content[global_offset:]
-                launch_id, launch_id2, record_size = self._parse_ownership_header(data)
-                if launch_id:
-                    records.append(launch_id)
-                    if launch_id2 != launch_id:
-                        records.append(launch_id2)
-                    global_offset += record_size
-                else:
-                    break
-        except:
-            log.exception("parse_ownership failed with exception. Possibly 'ownership' file corrupted")
-            return []
+            while offset < buffer_size and buffer[offset] == 0x0A:
+                record_size, offset = _read_varint(buffer, offset + 1)
+                record_end = offset + record_size
+                if record_end > buffer_size:
+                    raise ValueError(f"record at {offset} exceeds file size")
+
+                launch_ids = []
+                while offset < record_end:
+                    tag = buffer[offset]
+                    if tag < 0x80:
+                        offset += 1
+                    else:
+                        tag, offset = _read_varint(buffer, offset)
+                    if tag & 0x07 == 0:
+                        value, offset = _read_varint(buffer, offset)
+                        if (tag == 0x08 or tag == 0x10) and value:
+                            launch_ids.append(value)
+                    else:
+                        offset = _skip_field(buffer, offset, tag & 0x07)
+                if offset != record_end:
+                    raise ValueError(f"record field crosses record boundary at {offset}")
+                records.update(launch_ids)
+        except (ValueError, IndexError) as e:
+            log.warning(f"Ownership file corrupted, keeping {len(records)} records parsed so far: {repr(e)}")
         return records
 
     def _parse_game(self, game_yaml, launch_id):
@@ -547,16 +658,18 @@ class LocalParser(object):
         )
 
     def parse_games(self, configuration_data):
+        """Streams games out of the configuration file one record at a time"""
         self.configuration_raw = configuration_data
-
-        configuration_records = self._parse_configuration()
-        for launch_id, game in configuration_records.items():
-            if game['size']:
-                stream = self.configuration_raw[game['offset']: game['offset'] + game['size']].decode("utf8",
-                                                                                                      errors='ignore')
-                if stream and 'start_game' in stream:
-                    yaml_object = yaml.load(stream)
-                    yield self._parse_game(yaml_object, launch_id)
+        records = self._iter_configuration_records()
+        for launch_id, yaml_object in self._iter_game_yamls(records):
+            with metrics.timer('local.parse_game'):
+                game = self._parse_game(yaml_object, launch_id)
+            yield game
+
+    @staticmethod
+    def next_batch(games, size=LOCAL_FILES_PARSE_BATCH):
+        """Advances a parse_games stream by up to size games, an empty list once it is exhausted"""
+        return list(itertools.islice(games, size))
 
     def get_owned_local_games(self, ownership_data):
         self.ownership_raw = ownership_data
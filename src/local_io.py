@@ -0,0 +1,37 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from consts import LOCAL_IO_WORKERS
+from metrics import metrics
+
+
+class LocalIOPool(object):
+    """Small dedicated thread pool for blocking launcher file and registry reads.
+    Keeps them off the event loop without competing with backend requests for the default executor."""
+    def __init__(self, max_workers=LOCAL_IO_WORKERS):
+        self._max_workers = max_workers
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self._max_workers, thread_name_prefix='local-io')
+        return self._executor
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args)
+        if not metrics.enabled:
+            # skips building the metric name
+            return await loop.run_in_executor(self.executor, call)
+        with metrics.timer(f'local_io {func.__name__}'):
+            return await loop.run_in_executor(self.executor, call)
+
+    def shutdown(self, wait=False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+local_io = LocalIOPool()
@@ -0,0 +1,145 @@
+import bisect
+import json
+import logging as log
+import os
+import re
+import threading
+import time
+
+from consts import METRICS_ENABLED, METRICS_REPORT_INTERVAL, PLUGIN_DATA_PATH
+
+# upper bounds of latency histogram buckets in milliseconds
+_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+_ID_IN_URL = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+
+
+def endpoint_name(url):
+    """Url without query and with ids replaced, so requests to one endpoint share their metrics"""
+    return _ID_IN_URL.sub('{id}', url.split('?', 1)[0])
+
+
+class _Histogram(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(_BUCKETS_MS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(_BUCKETS_MS, seconds * 1000)] += 1
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total_seconds': round(self.total, 6),
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0,
+            'max_ms': round(self.max * 1000, 3),
+            'buckets_ms': {str(bound): count for bound, count in zip(_BUCKETS_MS + ('inf',), self.buckets)}
+        }
+
+
+class _Timer(object):
+    __slots__ = ('_metrics', '_name', '_started')
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.observe(self._name, time.perf_counter() - self._started)
+        return False
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics(object):
+    """Counters and latency histograms of the plugin hot paths.
+    When disabled every call returns right away, so instrumentation can stay in place."""
+    def __init__(self, enabled=METRICS_ENABLED, report_interval=METRICS_REPORT_INTERVAL,
+                 snapshot_path=os.path.join(PLUGIN_DATA_PATH, 'metrics.json')):
+        self.enabled = enabled
+        self.report_interval = report_interval
+        self.snapshot_path = snapshot_path
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._last_report = time.monotonic()
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = _Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'time': time.time(),
+                'counters': dict(self._counters),
+                'timers': {name: histogram.as_dict() for name, histogram in self._histograms.items()}
+            }
+
+    def write_snapshot(self, path=None):
+        path = path or self.snapshot_path
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            log.warning(f"Unable to write metrics snapshot {path}: {repr(e)}")
+
+    def log_summary(self):
+        snapshot = self.snapshot()
+        lines = [f"{name}: {value}" for name, value in sorted(snapshot['counters'].items())]
+        lines += [f"{name}: n={timer['count']} mean={timer['mean_ms']}ms max={timer['max_ms']}ms"
+                  for name, timer in sorted(snapshot['timers'].items())]
+        log.info("Metrics summary:\n" + "\n".join(lines))
+
+    def report_if_due(self):
+        """Logs a summary and writes the snapshot file once per report interval"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now - self._last_report < self.report_interval:
+            return
+        self._last_report = now
+        self.log_summary()
+        self.write_snapshot()
+
+
+metrics = Metrics()
@@ -0,0 +1,51 @@
+import time
+
+from galaxy.api.types import LocalGameState
+
+from consts import STATUS_NOTIFICATION_WINDOW
+from metrics import metrics
+
+
+class LocalGameStatusBatcher(object):
+    """Collects local game status updates and sends them to Galaxy once per tick.
+    Transitions of a game within the window collapse into its final state,
+    updates to the state Galaxy already knows about are dropped."""
+    def __init__(self, send, window=STATUS_NOTIFICATION_WINDOW, clock=time.monotonic):
+        self._send = send
+        self.window = window
+        self.clock = clock
+        self._pending = {}
+        self._known = {}
+
+    def set_known(self, local_games):
+        """Records states Galaxy got in get_local_games response, games missing there are not installed"""
+        self._known = {local_game.game_id: local_game.local_game_state for local_game in local_games}
+
+    def update(self, local_game):
+        metrics.count('notifications.queued')
+        pending = self._pending.get(local_game.game_id)
+        if pending is None:
+            self._pending[local_game.game_id] = (local_game, self.clock())
+        else:
+            metrics.count('notifications.coalesced')
+            self._pending[local_game.game_id] = (local_game, pending[1])
+
+    def flush(self):
+        """Sends updates queued at least window ago"""
+        if not self._pending:
+            return
+        now = self.clock()
+        for game_id, (local_game, queued) in list(self._pending.items()):
+            if now - queued < self.window:
+                continue
+            del self._pending[game_id]
+            if self._known.get(game_id, LocalGameState.None_) == local_game.local_game_state:
+                metrics.count('notifications.dropped')
+                continue
+            if local_game.local_game_state == LocalGameState.None_:
+                # the default for games missing in _known, keeps it bounded by games actually installed
+                self._known.pop(game_id, None)
+            else:
+                self._known[game_id] = local_game.local_game_state
+            metrics.count('notifications.sent')
+            self._send(local_game)
@@ -1,46 +1,184 @@
+import time
+_imports_started = time.perf_counter()
+
 import asyncio
 import logging as log
 import multiprocessing
 import subprocess
 import sys
-import webbrowser
-import datetime
-import dateutil.parser
-
 
 from galaxy.api.consts import Platform
-from galaxy.api.errors import InvalidCredentials, AccessDenied, AuthenticationRequired
+from galaxy.api.errors import InvalidCredentials, AccessDenied, AuthenticationRequired, BackendNotAvailable
 from galaxy.api.jsonrpc import Aborted
 from galaxy.api.plugin import Plugin, create_and_run_plugin
-from galaxy.api.types import Authentication, GameTime, Achievement, NextStep, FriendInfo
+from galaxy.api.types import Authentication, Game, GameTime, LicenseInfo, LicenseType, NextStep
 
 from backend import BackendClient
+from challenges import ChallengesCache
+from friends import FriendsCache
 from local import LocalParser, ProcessWatcher, GameStatusNotifier, LocalClient
 from definitions import GameStatus, System, SYSTEM, UbisoftGame, GameType
 from stats import find_playtime
-from consts import AUTH_PARAMS, COOKIES
+from consts import AUTH_PARAMS, COOKIES, LAZY_INITIALIZATION, OWNED_GAMES_MAX_STALENESS, GAME_TIMES_MAX_STALENESS
 from games_collection import GamesCollection
+from game_registry import GameRegistry
+from reparse import ReparsePipeline
+from metrics import metrics
+from profiler import profiler
+from local_io import local_io
+from notifications import LocalGameStatusBatcher
+from scheduler import TickScheduler
+from single_flight import SingleFlight
+from revalidation import RevalidatingCache
 from version import __version__
 from steam import is_steam_installed
 
+_imports_duration = time.perf_counter() - _imports_started
+
 
 class UplayPlugin(Plugin):
     def __init__(self, reader, writer, token):
+        init_started = time.perf_counter()
         super().__init__(Platform.Uplay, __version__, reader, writer, token)
         self.client = BackendClient(self)
-        self.local_client = LocalClient()
+        self.challenges = ChallengesCache(self.client)
+        self.friends = FriendsCache(self.client)
+        self.owned_games = RevalidatingCache(
+            'owned_games', self._fetch_owned_games, self._push_owned_games_changes, OWNED_GAMES_MAX_STALENESS,
+            serialize=lambda games: [[game.game_id, game.game_title] for game in games],
+            deserialize=lambda data: [Game(game_id, title, [], LicenseInfo(LicenseType.SinglePurchase))
+                                      for game_id, title in data])
+        self.game_times = RevalidatingCache(
+            'game_times', self._fetch_game_times, self._push_game_times_changes, GAME_TIMES_MAX_STALENESS,
+            serialize=lambda game_times: [[game_time.game_id, game_time.time_played, game_time.last_played_time]
+                                          for game_time in game_times],
+            deserialize=lambda data: [GameTime(*game_time) for game_time in data])
+        self._local_client = None
         self.cached_game_statuses = {}
+        # games_collection version _update_local_games_status last went through
+        self.statuses_collection_version = None
+        self.status_generation = 0
+        self.games_considered = 0
+        self.status_notifications = LocalGameStatusBatcher(super().update_local_game_status)
         self.games_collection = GamesCollection()
-        self.process_watcher = ProcessWatcher()
-        self.game_status_notifier = GameStatusNotifier(self.process_watcher)
-        self.tick_count = 0
-        self.updating_games = False
+        # space ids of the last club games response, these games stay known after vanishing from local files
+        self.club_space_ids = set()
+        self.game_registry = GameRegistry()
+        self.game_registry.register('plugin', self._forget_game)
+        self.process_watcher = ProcessWatcher(self.game_registry)
+        self.game_status_notifier = GameStatusNotifier(self.process_watcher, self.game_registry)
+        self.scheduler = TickScheduler()
+        self.scheduler.register('flush_status_notifications', self.status_notifications.flush, 1, priority=1)
+        self.local_files_lock = asyncio.Lock()
+        self.local_files_reparse = ReparsePipeline(self._reparse_local_files)
         self.owned_games_sent = False
-        self.parsing_club_games = False
+        self.single_flight = SingleFlight()
+        self.friends_sent = False
+        self.checking_local_files = False
+        self.prefetch_task = None
+        self.prefetched = set()
+        self.local_games_prefetch = None
+        if not LAZY_INITIALIZATION:
+            self._start_status_engine()
+        log.info(f"Plugin modules imported in {_imports_duration:.3f}s, "
+                 f"initialized in {time.perf_counter() - init_started:.3f}s")
+
+    @property
+    def local_client(self):
+        if self._local_client is None:
+            started = time.perf_counter()
+            self._local_client = LocalClient()
+            log.info(f"Local client initialized in {time.perf_counter() - started:.3f}s")
+        return self._local_client
+
+    def _start_status_engine(self):
+        """Starts watching local game statuses. With lazy initialization it waits for authentication."""
+        if self.game_status_notifier.started:
+            return
+        started = time.perf_counter()
+        self._update_launcher_paths()
+        self.game_status_notifier.start()
+        if SYSTEM == System.WINDOWS:
+            self.scheduler.register('refresh_game_statuses', self.refresh_game_statuses, 1, priority=2)
+            self.scheduler.register('update_launcher_paths', self._update_launcher_paths, 5)
+            self.scheduler.register('update_local_games_status', self._update_local_games_status, 9, cost=0.01)
+            self.scheduler.register('check_local_files', self._schedule_local_files_check, 9)
+        log.info(f"Status engine started in {time.perf_counter() - started:.3f}s")
+
+    def _on_authenticated(self, user_data):
+        self.local_client.initialize(user_data['userId'])
+        self.friends.restore(user_data['userId'])
+        self.owned_games.restore(user_data['userId'])
+        self.game_times.restore(user_data['userId'])
+        self.client.set_auth_lost_callback(self.auth_lost)
+        self._start_status_engine()
+        self._start_prefetch()
 
     def auth_lost(self):
+        self._cancel_prefetch()
         self.lost_authentication()
 
+    def _start_prefetch(self):
+        """Fetches what Galaxy asks for one call at a time after authentication, all at once.
+        Later calls are answered from the caches it fills."""
+        self.prefetched = {'owned_games', 'local_games', 'game_times', 'friends'}
+        self.local_games_prefetch = asyncio.ensure_future(
+            self.single_flight.run('get_local_games', self._get_local_games))
+        self.prefetch_task = asyncio.ensure_future(self._prefetch(self.local_games_prefetch))
+
+    async def _prefetch(self, local_games):
+        started = time.perf_counter()
+        await asyncio.gather(
+            self._prefetch_step('owned_games', self._prefetch_library()),
+            self._prefetch_step('local_games', local_games),
+            self._prefetch_step('friends', self.friends.refresh()),
+        )
+        log.info(f"Prefetched {sorted(self.prefetched)} in {time.perf_counter() - started:.3f}s")
+
+    async def _prefetch_library(self):
+        try:
+            await self.owned_games.refresh()
+        except Exception:
+            # game times are fetched for owned games
+            self.prefetched.discard('game_times')
+            raise
+        await self._prefetch_step('game_times', self.game_times.refresh())
+
+    async def _prefetch_step(self, name, awaitable):
+        try:
+            await awaitable
+        except asyncio.CancelledError:
+            self.prefetched.discard(name)
+            raise
+        except Exception as e:
+            log.warning(f"Prefetching {name} failed {repr(e)}")
+            self.prefetched.discard(name)
+
+    def _cancel_prefetch(self):
+        if self.prefetch_task is None or self.prefetch_task.done():
+            return
+        log.info("Authentication lost, cancelling prefetch")
+        self.prefetch_task.cancel()
+        self.owned_games.cancel()
+        self.game_times.cancel()
+        self.prefetched.clear()
+        self.local_games_prefetch = None
+
+    async def _answer_from_prefetch(self, name, awaitable):
+        """Awaits the answer to a Galaxy call, it counts as served by the prefetch only when both succeeded"""
+        prefetched = name in self.prefetched
+        result = await awaitable
+        if prefetched:
+            self._served_from_prefetch(name)
+        return result
+
+    def _served_from_prefetch(self, name):
+        # a failed prefetch step has discarded its name already
+        if name in self.prefetched:
+            self.prefetched.discard(name)
+            metrics.count(f'prefetch.served {name}')
+            log.info(f"Answering {name} from prefetched data")
+
     async def authenticate(self, stored_credentials=None):
         if not stored_credentials:
             return NextStep("web_session", AUTH_PARAMS, cookies=COOKIES)
@@ -53,148 +191,295 @@ class UplayPlugin(Plugin):
                 log.exception(repr(e))
                 raise Aborted()  # for sure this should be raised?
             else:
-                self.local_client.initialize(user_data['userId'])
-                self.client.set_auth_lost_callback(self.auth_lost)
+                self._on_authenticated(user_data)
                 return Authentication(user_data['userId'], user_data['username'])
 
     async def pass_login_credentials(self, step, credentials, cookies):
         """Called just after CEF authentication (called as NextStep by authenticate)"""
         user_data = await self.client.authorise_with_cookies(cookies)
-        self.local_client.initialize(user_data['userId'])
-        self.client.set_auth_lost_callback(self.auth_lost)
+        self._on_authenticated(user_data)
+        # fresh login, last results of a previous session are not worth showing
+        self.owned_games.invalidate()
+        self.game_times.invalidate()
         return Authentication(user_data['userId'], user_data['username'])
 
     async def get_owned_games(self):
         if not self.client.is_authenticated():
             raise AuthenticationRequired()
+        owned_games = await self._answer_from_prefetch('owned_games', self.owned_games.get())
+        self._mark_owned_games_sent()
+        return owned_games
 
-        self._parse_local_games()
-        self._parse_local_game_ownership()
-        await self._parse_club_games()
-
+    def _mark_owned_games_sent(self):
+        """From now on games reach Galaxy as owned games changes or as new games, never again in a list"""
         self.owned_games_sent = True
-
         for game in self.games_collection:
             game.considered_for_sending = True
 
+    async def _fetch_owned_games(self):
+        await self.single_flight.run('update_local_games', self._update_local_games)
+        club_games_fetched = await self._parse_club_games()
+        if not club_games_fetched and self.owned_games.value is not None:
+            # without club games the list would lack most of the games, the last good one is better
+            raise BackendNotAvailable()
+
+        if self.owned_games_sent:
+            # games added by a revalidation are pushed as owned games changes
+            self._mark_owned_games_sent()
+
         return [game.as_galaxy_game() for game in self.games_collection
                 if not self._game_ownership_is_glitched(game) and game.owned]
 
     async def _parse_club_games(self):
-        if not self.parsing_club_games:
-            try:
-                self.parsing_club_games = True
-                games = await self.client.get_club_titles()
-                club_games = []
-
-                for game in games:
-                    if "platform" in game:
-                        if game["platform"] == "PC":
-                            log.info(f"Parsed game from Club Request {game['title']}")
-                            club_games.append(
-                                UbisoftGame(
-                                    space_id=game['spaceId'],
-                                    launch_id='',
-                                    third_party_id='',
-                                    name=game['title'],
-                                    path='',
-                                    type=GameType.New,
-                                    special_registry_path='',
-                                    exe='',
-                                    status=GameStatus.Unknown,
-                                    owned=True
-                                ))
-
-                self.games_collection.append(club_games)
-            except Exception as e:
-                log.error(f"Encountered exception while parsing club games {repr(e)}")
-            finally:
-                self.parsing_club_games = False
-        else:
-            # Wait until club games get parsed if parsing is already in progress
-            while self.parsing_club_games:
-                await asyncio.sleep(0.2)
+        """Concurrent callers share a single club request, returns whether it succeeded"""
+        try:
+            await self.single_flight.run('club_games', self._fetch_club_games)
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error(f"Encountered exception while parsing club games {repr(e)}")
+            return False
+
+    async def _fetch_club_games(self):
+        games = await self.client.get_club_titles()
+        club_games = []
+
+        for game in games:
+            if "platform" in game:
+                if game["platform"] == "PC":
+                    log.info(f"Parsed game from Club Request {game['title']}")
+                    club_games.append(
+                        UbisoftGame(
+                            space_id=game['spaceId'],
+                            launch_id='',
+                            third_party_id='',
+                            name=game['title'],
+                            path='',
+                            type=GameType.New,
+                            special_registry_path='',
+                            exe='',
+                            status=GameStatus.Unknown,
+                            owned=True
+                        ))
+
+        self.games_collection.append(club_games)
+        self.club_space_ids = {game.space_id for game in club_games}
+
+    def _push_owned_games_changes(self, previous, current):
+        previous_ids = {game.game_id for game in previous or []}
+        current_ids = {game.game_id for game in current}
+        for game in current:
+            if game.game_id not in previous_ids:
+                log.info(f"Game {game.game_title} became owned since the last run")
+                self.add_game(game)
+        for game_id in previous_ids - current_ids:
+            log.info(f"Game {game_id} is no longer owned")
+            self.remove_game(game_id)
+
+    # The _read_* methods run in the local io pool. They only read and parse files and return fresh records,
+    # games_collection, the status caches and the registry are changed on the event loop only.
+
+    def _read_configuration(self):
+        """Stream of games parsed from the configuration file as it is advanced, None if it isn't accessible"""
+        if not self.local_client.configurations_accessible():
+            return None
+        return LocalParser().parse_games(self.local_client.read_config())
+
+    async def _merge_configuration(self):
+        """Merges the configuration file into games_collection a batch at a time, every batch is parsed
+        in the local io pool and merged on the event loop, so no more than a batch of parsed games is held.
+        Returns collection entries of the configured games, None if the file isn't accessible."""
+        games = await local_io.run(self._read_configuration)
+        if games is None:
+            return None
+        configured = []
+        while True:
+            batch = await local_io.run(LocalParser.next_batch, games)
+            if not batch:
+                return configured
+            configured.extend(self.games_collection.merge(batch))
+
+    def _read_ownership(self):
+        """Launch ids in the ownership file, None if it isn't accessible"""
+        if not self.local_client.ownership_accesible():
+            return None
+        ownership_records = LocalParser().get_owned_local_games(self.local_client.read_ownership())
+        log.info(f" Ownership Records {ownership_records}")
+        return ownership_records
+
+    def _apply_ownership(self, ownership_records):
+        for game in self.games_collection:
+            if game.launch_id:
+                if int(game.launch_id) in ownership_records:
+                    game.owned = True
 
-    def _parse_local_games(self):
+    def _update_games(self, configuration, ownership_records):
         """Parsing local files should lead to every game having a launch id.
         A game in the games_collection which doesn't have a launch id probably
         means that a game was added through the get_club_titles request but its space id
-        was not present in configuration file and we couldn't find a matching launch id for it."""
-        if self.local_client.configurations_accessible():
-            configuration_data = self.local_client.read_config()
-            p = LocalParser()
-            games = []
-            for game in p.parse_games(configuration_data):
-                games.append(game)
-            self.games_collection.append(games)
-
-    def _parse_local_game_ownership(self):
-        if self.local_client.ownership_accesible():
-            ownership_data = self.local_client.read_ownership()
-            p = LocalParser()
-            ownership_records = p.get_owned_local_games(ownership_data)
-            log.info(f" Ownership Records {ownership_records}")
-            for game in self.games_collection:
-                if game.launch_id:
-                    if int(game.launch_id) in ownership_records:
-                        game.owned = True
+        was not present in configuration file and we couldn't find a matching launch id for it.
+        configuration are the merged entries _merge_configuration returns.
+        Returns launch ids present in the configuration or ownership files, None if either couldn't be read."""
+        configured = None
+        if configuration is not None:
+            configured = {game.launch_id for game in configuration}
+        if ownership_records is not None:
+            self._apply_ownership(ownership_records)
+        if configured is None or ownership_records is None:
+            return None
+        return configured | {str(launch_id) for launch_id in ownership_records}
+
+    def _evict_vanished_games(self, launch_ids):
+        if launch_ids is not None:
+            self.game_registry.retain(launch_ids)
+
+    def _forget_game(self, launch_id):
+        """Drops the plugin's state of a game which vanished from the local files.
+        Games the club reports as owned keep their entry without the launch id, others are removed,
+        from Galaxy too if it got them."""
+        self.cached_game_statuses.pop(launch_id, None)
+        game = self.games_collection.get(launch_id)
+        if game is None or game.launch_id != launch_id:
+            return
+        if game.status in [GameStatus.Installed, GameStatus.Running]:
+            game.status = GameStatus.NotInstalled
+            self.update_local_game_status(game.as_local_game())
+        if game.space_id in self.club_space_ids:
+            self.games_collection.detach_launch_id(game)
+            return
+        if self.owned_games_sent and game.considered_for_sending and game.owned:
+            game_id = game.as_galaxy_game().game_id
+            log.info(f"Game {game.name} vanished from local files, removing it")
+            self.remove_game(game_id)
+            self.owned_games.update_served(lambda games: [game for game in games if game.game_id != game_id])
+        if self.games_collection.discard(game) < self.games_considered:
+            self.games_considered -= 1
+
+    def _cache_game_status(self, game):
+        self.cached_game_statuses[game.launch_id] = game.status
+        self.game_registry.acquire(game.launch_id, 'plugin')
+
+    async def _update_local_games(self):
+        async with self.local_files_lock:
+            configuration = await self._merge_configuration()
+            ownership_records = await local_io.run(self._read_ownership)
+            self._evict_vanished_games(self._update_games(configuration, ownership_records))
+
+    def _sendable_games(self):
+        return {game.space_id or game.launch_id: game for game in self.games_collection
+                if not self._game_ownership_is_glitched(game) and game.owned}
+
+    async def _reparse_local_files(self):
+        async with self.local_files_lock:
+            sendable_before = self._sendable_games()
+            configuration = await self._merge_configuration()
+            ownership_records = await local_io.run(self._read_ownership)
+            self._evict_vanished_games(self._update_games(configuration, ownership_records))
+            sendable_after = self._sendable_games()
+
+        if not self.owned_games_sent:
+            return
+        for game_id, game in sendable_after.items():
+            if game_id not in sendable_before:
+                log.info(f"Game {game.name} became owned after reparse")
+                game.considered_for_sending = True
+                self._send_new_game(game)
 
-    def _update_games(self):
-        self.updating_games = True
-        self._parse_local_games()
-        self.updating_games = False
+    def _send_new_game(self, game):
+        """Adds the game in Galaxy and to the owned games result it was served, so revalidation doesn't add it again"""
+        galaxy_game = game.as_galaxy_game()
+        self.add_game(galaxy_game)
+        self.owned_games.update_served(
+            lambda games: [served for served in games if served.game_id != galaxy_game.game_id] + [galaxy_game])
 
     def _update_local_games_status(self):
         cached_statuses = self.cached_game_statuses
         if cached_statuses is None:
             return
+        if self.statuses_collection_version == self.games_collection.version:
+            return
+        self.statuses_collection_version = self.games_collection.version
 
         for game in self.games_collection:
+            if not game.launch_id:
+                # club games which aren't in the local files, there is no status to probe
+                continue
             if game.launch_id in cached_statuses:
                 self.game_status_notifier.update_game(game)
                 if game.status != cached_statuses[game.launch_id]:
                     log.info(f"Game {game.name} path changed: updating status from {cached_statuses[game.launch_id]} to {game.status}")
                     self.update_local_game_status(game.as_local_game())
-                    self.cached_game_statuses[game.launch_id] = game.status
+                    self._cache_game_status(game)
             else:
                 self.game_status_notifier.update_game(game)
                 ''' If a game wasn't previously in a cache then and it appears with an installed or running status
                  it most likely means that client was just installed '''
                 if game.status in [GameStatus.Installed, GameStatus.Running]:
                     self.update_local_game_status(game.as_local_game())
-                self.cached_game_statuses[game.launch_id] = game.status
+                self._cache_game_status(game)
 
-    async def get_local_games(self):
-        self._parse_local_games()
+    def _collect_local_games(self, configuration):
+        local_games = {}
+        for game in configuration or []:
+            self._cache_game_status(game)
+            if game.status == GameStatus.Installed or game.status == GameStatus.Running:
+                local_games[game.launch_id] = game.as_local_game()
+        return list(local_games.values())
 
-        local_games = []
+    async def _get_local_games(self):
+        async with self.local_files_lock:
+            return self._collect_local_games(await self._merge_configuration())
 
-        for game in self.games_collection:
-            self.cached_game_statuses[game.launch_id] = game.status
-            if game.status == GameStatus.Installed or game.status == GameStatus.Running:
-                local_games.append(game.as_local_game())
+    async def get_local_games(self):
+        local_games = None
+        prefetched, self.local_games_prefetch = self.local_games_prefetch, None
+        if prefetched is not None:
+            try:
+                local_games = await self._answer_from_prefetch('local_games', prefetched)
+            except Exception as e:
+                log.warning(f"Prefetched local games unavailable {repr(e)}")
+        if local_games is None:
+            local_games = await self.single_flight.run('get_local_games', self._get_local_games)
+        self.status_notifications.set_known(local_games)
         self._update_local_games_status()
         return local_games
 
     def _game_ownership_is_glitched(self, game):
         """" If we have access to local configuration files we can determine whether the game is glitched
         for example is reported by the uplay club as owned but is not recognized so by the client. """
-        if self.local_client.configurations_accessible():
-            if not game.launch_id:
+        # Games with launch id are fine, checking them first saves a file access per game
+        if not game.launch_id:
+            if self.local_client.configurations_accessible():
                 return True
         # No local files present, cant determine
         return False
 
     async def _add_new_games(self, games):
         await self._parse_club_games()
-        self._parse_local_game_ownership()
+        async with self.local_files_lock:
+            ownership_records = await local_io.run(self._read_ownership)
+            if ownership_records is not None:
+                self._apply_ownership(ownership_records)
         for game in games:
             if not self._game_ownership_is_glitched(game) and game.owned:
-                self.add_game(game.as_galaxy_game())
+                self._send_new_game(game)
 
     async def get_game_times(self):
         if not self.client.is_authenticated():
             raise AuthenticationRequired()
+        return await self._answer_from_prefetch('game_times', self.game_times.get())
+
+    def _push_game_times_changes(self, previous, current):
+        previous = {game_time.game_id: game_time for game_time in previous or []}
+        for game_time in current:
+            if previous.get(game_time.game_id) != game_time:
+                self.update_game_time(game_time)
+
+    async def _fetch_game_times(self):
+        # games come from owned games, wait for them when they are being revalidated or were never fetched
+        if self.owned_games.refreshing or not self.games_collection:
+            await self.owned_games.refresh()
         game_times = []
         games_with_space = [game for game in self.games_collection if game.space_id]
         try:
@@ -210,24 +495,23 @@ class UplayPlugin(Plugin):
                     game_times.append(GameTime(game.space_id, playtime, last_played))
         except Exception as e:
             log.exception("Game times:" + repr(e))
-        finally:
-            return game_times
+            # partial times would replace the last good ones
+            if self.game_times.value is not None:
+                raise
+        return game_times
 
     async def get_unlocked_challenges(self, game_id):
         """Challenges are a unique uplay club feature and don't directly translate to achievements"""
         if not self.client.is_authenticated():
             raise AuthenticationRequired()
-        for game in self.games_collection:
-            if game.space_id == game_id or game.launch_id == game_id:
-                if not game.space_id:
-                    return[]
-                challenges = await self.client.get_challenges(game.space_id)
-                return [
-                    Achievement(achievement_id=challenge["id"], achievement_name=challenge["name"],
-                                unlock_time=int(
-                                    datetime.datetime.timestamp(dateutil.parser.parse(challenge["completionDate"]))))
-                    for challenge in challenges["actions"] if challenge["isCompleted"] and not challenge["isBadge"]
-                ]
+        if self.challenges.prefetch_due:
+            self.challenges.prefetch(game.space_id for game in self.games_collection if game.space_id and game.owned)
+        game = self.games_collection.get(game_id)
+        if game is None:
+            return None
+        if not game.space_id:
+            return []
+        return await self.challenges.get_unlocked(game.space_id)
 
     async def launch_game(self, game_id):
         if not self.user_can_perform_actions():
@@ -295,33 +579,48 @@ class UplayPlugin(Plugin):
         subprocess.Popen(f"start uplay://", shell=True)
 
     def open_uplay_browser(self):
+        import webbrowser
         url = f'https://uplay.ubisoft.com'
         log.info(f"Opening uplay website: {url}")
         webbrowser.open(url, autoraise=True)
 
+    def _apply_game_status(self, game, status):
+        if status == GameStatus.Installed and game.status != GameStatus.Installed:
+            log.info(f"updating status for {game.name} to installed")
+            game.status = GameStatus.Installed
+        elif status == GameStatus.Running and game.status != GameStatus.Running:
+            log.info(f"updating status for {game.name} to running")
+            game.status = GameStatus.Running
+        elif status in [GameStatus.NotInstalled, GameStatus.Unknown] and game.status not in [GameStatus.NotInstalled, GameStatus.Unknown]:
+            log.info(f"updating status for {game.name} to not installed")
+            game.status = GameStatus.NotInstalled
+        else:
+            return
+        self.update_local_game_status(game.as_local_game())
+        self._cache_game_status(game)
+
+    def update_local_game_status(self, local_game):
+        """Queues the update, status_notifications sends it on one of the next ticks"""
+        self.status_notifications.update(local_game)
+
     def refresh_game_statuses(self):
+        """Applies status changes reported since the last call, only games which changed are visited"""
         if not self.local_client.was_user_logged_in:
             return
-        statuses = self.game_status_notifier.statuses
+        changes, self.status_generation = self.game_status_notifier.changes_since(self.status_generation)
+        for launch_id, _, status, _ in changes:
+            game = self.games_collection.get(launch_id)
+            if game is not None:
+                self._apply_game_status(game, status)
 
+        if not self.owned_games_sent:
+            return
+        # only games appended since the last call can still wait to be considered for sending
+        appended = self.games_collection[self.games_considered:]
+        self.games_considered += len(appended)
         new_games = []
-
-        for game in self.games_collection:
-            if game.launch_id in statuses:
-                if statuses[game.launch_id] == GameStatus.Installed and game.status != GameStatus.Installed:
-                    log.info(f"updating status for {game.name} to installed")
-                    game.status = GameStatus.Installed
-                    self.update_local_game_status(game.as_local_game())
-                elif statuses[game.launch_id] == GameStatus.Running and game.status != GameStatus.Running:
-                    log.info(f"updating status for {game.name} to running")
-                    game.status = GameStatus.Running
-                    self.update_local_game_status(game.as_local_game())
-                elif statuses[game.launch_id] in [GameStatus.NotInstalled, GameStatus.Unknown] and game.status not in [GameStatus.NotInstalled, GameStatus.Unknown]:
-                    log.info(f"updating status for {game.name} to not installed")
-                    game.status = GameStatus.NotInstalled
-                    self.update_local_game_status(game.as_local_game())
-
-            if self.owned_games_sent and not game.considered_for_sending:
+        for game in appended:
+            if not game.considered_for_sending:
                 game.considered_for_sending = True
                 new_games.append(game)
 
@@ -329,27 +628,50 @@ class UplayPlugin(Plugin):
             asyncio.create_task(self._add_new_games(new_games))
 
     async def get_friends(self):
-        friends = await self.client.get_friends()
-        return [
-            FriendInfo(user_id=friend["pid"], user_name=friend["nameOnPlatform"])
-            for friend in friends["friends"]
-        ]
+        friends = await self._answer_from_prefetch('friends', self.friends.get_friends())
+        self.friends_sent = True
+        return friends
+
+    async def _refresh_friends(self):
+        try:
+            added, removed = await self.friends.refresh()
+        except Exception as e:
+            log.error(f"Encountered exception while refreshing friends {repr(e)}")
+            return
+        for friend in added:
+            log.info(f"New friend {friend.user_name}")
+            self.add_friend(friend)
+        for user_id in removed:
+            log.info(f"Friend {user_id} removed")
+            self.remove_friend(user_id)
+
+    async def _check_local_files(self):
+        self.checking_local_files = True
+        try:
+            changed = await local_io.run(self.local_client.local_files_changed)
+        finally:
+            self.checking_local_files = False
+        if changed:
+            log.info('Ownership or configurations file has been changed or created. Reparsing.')
+            self.local_files_reparse.request()
+
+    def _update_launcher_paths(self):
+        self.game_status_notifier.launcher_log_path = self.local_client.launcher_log_path
+        self.game_status_notifier.launcher_cache_path = self.local_client.launcher_cache_path
+
+    def _schedule_local_files_check(self):
+        if not self.checking_local_files:
+            asyncio.create_task(self._check_local_files())
 
     def tick(self):
-        loop = asyncio.get_event_loop()
-        if SYSTEM == System.WINDOWS:
-            self.tick_count += 1
-            if self.tick_count % 1 == 0:
-                self.refresh_game_statuses()
-            if self.tick_count % 5 == 0:
-                self.game_status_notifier.launcher_log_path = self.local_client.launcher_log_path
-            if self.tick_count % 9 == 0:
-                self._update_local_games_status()
-                if self.local_client.ownership_changed():
-                    if not self.updating_games:
-                        log.info('Ownership file has been changed or created. Reparsing.')
-                        loop.run_in_executor(None, self._update_games)
-        return
+        with metrics.timer('plugin.tick'):
+            if self.friends_sent and self.friends.refresh_due and not self.friends.refreshing:
+                asyncio.create_task(self._refresh_friends())
+            self.scheduler.tick()
+        metrics.report_if_due()
+        if self.game_status_notifier.thread is not None:
+            profiler.register_thread('status_notifier', self.game_status_notifier.thread.ident)
+        profiler.check()
 
 
 def main():
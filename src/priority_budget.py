@@ -0,0 +1,119 @@
+import asyncio
+import enum
+import heapq
+import itertools
+import logging as log
+import time
+
+from consts import REQUEST_PRIORITY_AGING, ADAPTIVE_MIN_REQUESTS_IN_FLIGHT, ADAPTIVE_LATENCY_TARGET
+from metrics import metrics
+
+
+class RequestPriority(enum.IntEnum):
+    AUTH = 0
+    INTERACTIVE = 1
+    BACKGROUND = 2
+
+
+class PriorityBudget(object):
+    """Limits requests in flight like a semaphore, but hands freed slots to the most important waiting request.
+    Waiting requests age, every `aging` seconds in the queue count as one priority class,
+    so a stream of interactive requests can't starve background ones."""
+    def __init__(self, limit, aging=REQUEST_PRIORITY_AGING):
+        self._limit = limit
+        self._aging = aging
+        self._in_flight = 0
+        # aging is the same for everyone, so ordering by priority adjusted with enqueue time never changes
+        self._waiters = []
+        self._counter = itertools.count()
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @limit.setter
+    def limit(self, limit):
+        self._limit = limit
+        self._dispatch()
+
+    @property
+    def waiting(self):
+        return sum(1 for _, _, future in self._waiters if not future.cancelled())
+
+    def slot(self, priority):
+        return _Slot(self, priority)
+
+    async def acquire(self, priority):
+        enqueued = time.monotonic()
+        if self._in_flight < self._limit and not self._waiters:
+            self._in_flight += 1
+        else:
+            future = asyncio.get_event_loop().create_future()
+            heapq.heappush(self._waiters, (priority + enqueued / self._aging, next(self._counter), future))
+            self._dispatch()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # got the slot just as it was cancelled
+                    self.release()
+                raise
+        if metrics.enabled:
+            metrics.observe(f'backend.queue_wait {priority.name.lower()}', time.monotonic() - enqueued)
+
+    def release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._in_flight < self._limit and self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._in_flight += 1
+                future.set_result(None)
+
+
+class AdaptiveLimit(object):
+    """Drives the budget limit by additive increase, multiplicative decrease.
+    Each fast successful response raises the limit by 1/limit, a failure or a response slower than
+    the latency target halves it. Decreases are at most once per latency target, since responses
+    to requests sent together report the same trouble."""
+    def __init__(self, budget, min_limit=ADAPTIVE_MIN_REQUESTS_IN_FLIGHT, latency_target=ADAPTIVE_LATENCY_TARGET,
+                 decrease_factor=0.5):
+        self._budget = budget
+        self._min_limit = min_limit
+        self._max_limit = budget.limit
+        self._latency_target = latency_target
+        self._decrease_factor = decrease_factor
+        self._limit = float(budget.limit)
+        self._last_decrease = None
+
+    def record(self, latency, failed):
+        now = time.monotonic()
+        if failed or latency > self._latency_target:
+            if self._last_decrease is not None and now - self._last_decrease < self._latency_target:
+                return
+            self._last_decrease = now
+            self._limit = max(self._min_limit, self._limit * self._decrease_factor)
+        else:
+            self._limit = min(self._max_limit, self._limit + 1 / self._limit)
+        limit = int(self._limit)
+        if limit != self._budget.limit:
+            log.debug(f"Requests in flight limit {self._budget.limit} -> {limit}")
+            metrics.count('backend.limit_decreased' if limit < self._budget.limit else 'backend.limit_increased')
+            self._budget.limit = limit
+
+
+class _Slot(object):
+    __slots__ = ('_budget', '_priority')
+
+    def __init__(self, budget, priority):
+        self._budget = budget
+        self._priority = priority
+
+    async def __aenter__(self):
+        await self._budget.acquire(self._priority)
+
+    async def __aexit__(self, *exc):
+        self._budget.release()
+        return False
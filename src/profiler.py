@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging as log
+import os
+import sys
+import threading
+import time
+
+from consts import PLUGIN_DATA_PATH, PROFILER_ENV_VARIABLE, PROFILER_MARKER_FILE, PROFILER_WINDOW, \
+    PROFILER_SAMPLE_INTERVAL, PROFILER_LAG_PROBE_INTERVAL
+from metrics import metrics
+
+
+def _log_directory():
+    """Directory of the plugin log file, plugin data directory if logging doesn't go to a file"""
+    for handler in log.getLogger().handlers:
+        filename = getattr(handler, 'baseFilename', None)
+        if filename:
+            return os.path.dirname(filename)
+    return PLUGIN_DATA_PATH
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+def _lag_summary(lags):
+    if not lags:
+        return {'count': 0}
+    lags = sorted(lags)
+    return {
+        'count': len(lags),
+        'mean_ms': round(sum(lags) / len(lags) * 1000, 3),
+        'p99_ms': round(lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000, 3),
+        'max_ms': round(lags[-1] * 1000, 3),
+    }
+
+
+class Profiler(object):
+    """Opt-in sampling profiler for a live plugin.
+    Started by the environment variable or by creating the marker file in the plugin data directory,
+    it samples stacks of registered threads for a fixed window and measures how late the event loop runs callbacks.
+    Results are written next to the plugin log as collapsed stacks, ready for flamegraph.pl or speedscope."""
+    def __init__(self, window=PROFILER_WINDOW, sample_interval=PROFILER_SAMPLE_INTERVAL,
+                 lag_probe_interval=PROFILER_LAG_PROBE_INTERVAL,
+                 marker_path=os.path.join(PLUGIN_DATA_PATH, PROFILER_MARKER_FILE)):
+        self.window = window
+        self.sample_interval = sample_interval
+        self.lag_probe_interval = lag_probe_interval
+        self.marker_path = marker_path
+        self.running = False
+        self._env_requested = bool(os.getenv(PROFILER_ENV_VARIABLE))
+        self._threads = {}
+        self._stacks = {}
+        self._callback_lags = []
+        self._tick_lags = []
+        self._last_tick = None
+
+    def register_thread(self, name, ident):
+        if ident is not None:
+            self._threads[name] = ident
+
+    def _requested(self):
+        if self._env_requested:
+            self._env_requested = False
+            return True
+        try:
+            os.remove(self.marker_path)
+            return True
+        except OSError:
+            return False
+
+    def check(self, tick_interval=1):
+        """Called every tick from the event loop, starts the profiler on request and measures tick lag"""
+        now = time.monotonic()
+        if self.running and self._last_tick is not None:
+            self._tick_lags.append(max(0.0, now - self._last_tick - tick_interval))
+        self._last_tick = now
+        if not self.running and self._requested():
+            self.start()
+
+    def start(self):
+        if self.running:
+            return
+        self.register_thread('event_loop', threading.get_ident())
+        log.info(f"Profiling threads {sorted(self._threads)} for {self.window}s")
+        self.running = True
+        self._stacks = {}
+        self._callback_lags = []
+        self._tick_lags = []
+        loop = asyncio.get_event_loop()
+        finished = loop.create_future()
+        threading.Thread(target=self._sample, args=(loop, finished), daemon=True).start()
+        loop.create_task(self._probe_lag(finished))
+
+    async def _probe_lag(self, finished):
+        loop = asyncio.get_event_loop()
+        while not finished.done():
+            expected = loop.time() + self.lag_probe_interval
+            await asyncio.sleep(self.lag_probe_interval)
+            lag = max(0.0, loop.time() - expected)
+            self._callback_lags.append(lag)
+            metrics.observe('loop.lag', lag)
+
+    def _sample(self, loop, finished):
+        names = {ident: name for name, ident in self._threads.items()}
+        deadline = time.monotonic() + self.window
+        try:
+            while time.monotonic() < deadline:
+                frames = sys._current_frames()
+                for ident, name in names.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = f"{name};{_collapse(frame)}"
+                    self._stacks[stack] = self._stacks.get(stack, 0) + 1
+                del frames
+                time.sleep(self.sample_interval)
+            self._write_report()
+        except Exception as e:
+            log.exception(f"Profiling failed {repr(e)}")
+        finally:
+            self.running = False
+            try:
+                loop.call_soon_threadsafe(finished.set_result, None)
+            except RuntimeError:
+                pass  # loop closed while sampling
+
+    def _write_report(self):
+        directory = _log_directory()
+        base = os.path.join(directory, f"uplay-profile-{time.strftime('%Y%m%d-%H%M%S')}")
+        os.makedirs(directory, exist_ok=True)
+        with open(base + '.folded', 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self._stacks.items()):
+                f.write(f"{stack} {count}\n")
+        lag = {
+            'window_seconds': self.window,
+            'callback_lag': _lag_summary(self._callback_lags),
+            'tick_lag': _lag_summary(self._tick_lags),
+        }
+        with open(base + '.lag.json', 'w', encoding='utf-8') as f:
+            json.dump(lag, f, indent=2)
+        log.info(f"Profile written to {base}.folded, event loop lag: {lag}")
+
+
+profiler = Profiler()
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from definitions import SYSTEM, System
+from consts import REGISTRY_CACHE_TTL
+from metrics import metrics
+
+if SYSTEM == System.WINDOWS:
+    import winreg
+    HKEY_LOCAL_MACHINE = winreg.HKEY_LOCAL_MACHINE
+    HKEY_CURRENT_USER = winreg.HKEY_CURRENT_USER
+else:
+    HKEY_LOCAL_MACHINE = 'HKEY_LOCAL_MACHINE'
+    HKEY_CURRENT_USER = 'HKEY_CURRENT_USER'
+
+
+class WinregBackend(object):
+    def query_value(self, hive, path, name):
+        with winreg.OpenKey(hive, path, 0, winreg.KEY_READ) as key:
+            return winreg.QueryValueEx(key, name)[0]
+
+    @staticmethod
+    def _enum_values(key):
+        _, values_count, _ = winreg.QueryInfoKey(key)
+        values = {}
+        for i in range(values_count):
+            name, value, _ = winreg.EnumValue(key, i)
+            values[name] = value
+        return values
+
+    def enum_subkeys(self, hive, path):
+        subkeys = {}
+        with winreg.OpenKey(hive, path, 0, winreg.KEY_READ) as key:
+            subkeys_count, _, _ = winreg.QueryInfoKey(key)
+            for i in range(subkeys_count):
+                name = winreg.EnumKey(key, i)
+                try:
+                    with winreg.OpenKey(key, name, 0, winreg.KEY_READ) as subkey:
+                        subkeys[name] = self._enum_values(subkey)
+                except OSError:
+                    continue  # removed while enumerating
+        return subkeys
+
+
+class MemoryBackend(object):
+    """Registry kept in a dict, lets the local status pipeline run on systems without winreg"""
+    def __init__(self):
+        self.keys = {}
+
+    @staticmethod
+    def _key(hive, path):
+        return hive, path.lower()
+
+    def set_value(self, hive, path, name, value):
+        self.keys.setdefault(self._key(hive, path), {})[name] = value
+
+    def delete_key(self, hive, path):
+        prefix = path.lower() + '\\'
+        for key in list(self.keys):
+            if key[0] == hive and (key[1] == path.lower() or key[1].startswith(prefix)):
+                del self.keys[key]
+
+    def query_value(self, hive, path, name):
+        try:
+            return self.keys[self._key(hive, path)][name]
+        except KeyError:
+            raise FileNotFoundError(f"{path}\\{name}")
+
+    def enum_subkeys(self, hive, path):
+        prefix = path.lower() + '\\'
+        subkeys = {}
+        for (key_hive, key_path), values in self.keys.items():
+            if key_hive == hive and key_path.startswith(prefix) and '\\' not in key_path[len(prefix):]:
+                subkeys[key_path[len(prefix):]] = dict(values)
+        if not subkeys and self._key(hive, path) not in self.keys:
+            raise FileNotFoundError(path)
+        return subkeys
+
+
+class Registry(object):
+    """Read-only registry access memoizing values and enumerated keys (missing ones included)
+    for REGISTRY_CACHE_TTL seconds, so one status cycle touches every key at most once."""
+    def __init__(self, backend, ttl=REGISTRY_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def set_backend(self, backend):
+        self.backend = backend
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._cache = {}
+
+    def _memoized(self, cache_key, fetch):
+        now = time.monotonic()
+        entry = self._cache.get(cache_key)
+        if entry is None or entry[0] < now:
+            try:
+                with metrics.timer('registry.read'):
+                    entry = (now + self.ttl, fetch(), None)
+            except OSError as e:
+                entry = (now + self.ttl, None, e)
+            with self._lock:
+                self._cache[cache_key] = entry
+        _, value, error = entry
+        if error is not None:
+            raise error
+        return value
+
+    def get_value(self, hive, path, name):
+        return self._memoized(('value', hive, path.lower(), name),
+                              lambda: self.backend.query_value(hive, path, name))
+
+    def get_subkeys(self, hive, path):
+        """Returns {subkey name: {value name: value}} for all direct subkeys of path"""
+        return self._memoized(('subkeys', hive, path.lower()),
+                              lambda: self.backend.enum_subkeys(hive, path))
+
+
+if SYSTEM == System.WINDOWS:
+    registry = Registry(WinregBackend())
+else:
+    registry = Registry(MemoryBackend())
@@ -0,0 +1,36 @@
+import asyncio
+import logging as log
+import time
+
+from consts import LOCAL_FILES_REPARSE_DEBOUNCE
+
+
+class ReparsePipeline(object):
+    """Runs reparse after the launcher files stop changing for the debounce period.
+    Requests coming in while a reparse is pending or running coalesce into a single follow-up run."""
+    def __init__(self, reparse, debounce=LOCAL_FILES_REPARSE_DEBOUNCE):
+        self._reparse = reparse
+        self._debounce = debounce
+        self._deadline = None
+        self._task = None
+
+    @property
+    def pending(self):
+        return self._task is not None and not self._task.done()
+
+    def request(self):
+        self._deadline = time.monotonic() + self._debounce
+        if not self.pending:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._deadline is not None:
+            delay = self._deadline - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self._deadline = None
+            try:
+                await self._reparse()
+            except Exception as e:
+                log.error(f"Reparsing local files failed {repr(e)}")
@@ -0,0 +1,108 @@
+import asyncio
+import logging as log
+import time
+
+from consts import REVALIDATE_AFTER
+from metrics import metrics
+from single_flight import SingleFlight
+from storage import load_snapshot, save_snapshot
+
+
+class RevalidatingCache(object):
+    """Last good result of a plugin method, persisted between plugin runs.
+    A result younger than max_staleness is returned right away and a fresh one is fetched in the background.
+    Whenever a fetched result differs from the one returned last, on_change is called with both.
+    Older results or a forced get wait for the fetch."""
+    def __init__(self, name, fetch, on_change, max_staleness, serialize=None, deserialize=None,
+                 revalidate_after=REVALIDATE_AFTER):
+        self.name = name
+        self._fetch = fetch
+        self._on_change = on_change
+        self.max_staleness = max_staleness
+        self.revalidate_after = revalidate_after
+        self._serialize = serialize or (lambda value: value)
+        self._deserialize = deserialize or (lambda data: data)
+        self._single_flight = SingleFlight()
+        self._snapshot_name = None
+        self.value = None
+        self._fetched_at = None
+        self._served = None
+
+    def restore(self, user_id):
+        """Switches to the user's persisted result, nothing of a previous user survives"""
+        self._snapshot_name = f"{self.name}_{user_id}"
+        self._forget()
+        snapshot = load_snapshot(self._snapshot_name)
+        if snapshot:
+            try:
+                self.value = self._deserialize(snapshot['value'])
+                self._fetched_at = snapshot['fetched_at']
+                log.info(f"Restored {self.name} fetched at {time.ctime(self._fetched_at)}")
+            except Exception as e:
+                self._forget()
+                log.warning(f"Unable to restore {self.name} snapshot {repr(e)}")
+
+    def _forget(self):
+        self.value = None
+        self._fetched_at = None
+        self._served = None
+
+    def invalidate(self):
+        """Drops the last result, the next get waits for a fresh one and fails along with it"""
+        self._forget()
+
+    def update_served(self, update):
+        """Applies a change the plugin pushed on its own to the result Galaxy has, so it isn't pushed again"""
+        if self._served is not None:
+            self._served = update(self._served)
+
+    @property
+    def fresh_enough(self):
+        return self.value is not None and self._fetched_at is not None \
+            and time.time() - self._fetched_at <= self.max_staleness
+
+    @property
+    def refreshing(self):
+        return self._single_flight.in_flight('refresh')
+
+    def cancel(self):
+        self._single_flight.cancel('refresh')
+
+    async def get(self, force=False):
+        if force or not self.fresh_enough:
+            try:
+                value = await self.refresh()
+            except Exception as e:
+                if force or self.value is None:
+                    raise
+                log.warning(f"Fetching {self.name} failed, answering with the last result {repr(e)}")
+                value = self.value
+        else:
+            value = self.value
+            if time.time() - self._fetched_at > self.revalidate_after and not self.refreshing:
+                metrics.count(f'revalidation.served_stale {self.name}')
+                asyncio.ensure_future(self._revalidate())
+        self._served = value
+        return value
+
+    async def refresh(self):
+        """Fetches a fresh result, concurrent callers share the fetch"""
+        return await self._single_flight.run('refresh', self._refresh)
+
+    async def _refresh(self):
+        value = await self._fetch()
+        self.value = value
+        self._fetched_at = time.time()
+        if self._snapshot_name:
+            save_snapshot(self._snapshot_name, {'fetched_at': self._fetched_at, 'value': self._serialize(value)})
+        if self._served is not None and value != self._served:
+            previous, self._served = self._served, value
+            metrics.count(f'revalidation.changed {self.name}')
+            self._on_change(previous, value)
+        return value
+
+    async def _revalidate(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            log.warning(f"Revalidating {self.name} failed, keeping the last result {repr(e)}")
@@ -0,0 +1,70 @@
+import logging as log
+import time
+
+from consts import TICK_BUDGET
+from metrics import metrics
+
+# ticks looked ahead when picking the least busy offset for a new job
+_STAGGER_HORIZON = 60
+# weight of the last run when updating job cost estimate
+_COST_SMOOTHING = 0.2
+
+
+class TickJob(object):
+    def __init__(self, name, func, interval, priority, cost, offset):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.priority = priority
+        self.cost = cost
+        self.offset = offset
+        self.next_due = offset
+
+    def due_on(self, tick):
+        return tick >= self.offset and (tick - self.offset) % self.interval == 0
+
+
+class TickScheduler(object):
+    """Runs periodic jobs from plugin tick within a time budget.
+    Due jobs run by priority, a job gains priority for every tick it waits, so jobs which didn't fit
+    into the budget carry over without starving. Jobs are staggered, expensive ones don't share ticks."""
+    def __init__(self, budget=TICK_BUDGET):
+        self.budget = budget
+        self.jobs = []
+        self.tick_count = 0
+
+    def _load(self, offset, interval):
+        return sum(job.cost for tick in range(offset, offset + _STAGGER_HORIZON, interval)
+                   for job in self.jobs if job.due_on(tick))
+
+    def register(self, name, func, interval, priority=0, cost=0.001):
+        """Runs func every interval ticks, cost is the initial estimate of its duration in seconds"""
+        start = self.tick_count + 1
+        offset = min(range(start, start + interval), key=lambda offset: self._load(offset, interval))
+        job = TickJob(name, func, interval, priority, cost, offset)
+        self.jobs.append(job)
+        return job
+
+    def tick(self):
+        self.tick_count += 1
+        due = [job for job in self.jobs if job.next_due <= self.tick_count]
+        if not due:
+            return
+        due.sort(key=lambda job: job.priority + self.tick_count - job.next_due, reverse=True)
+        started = time.perf_counter()
+        for i, job in enumerate(due):
+            if i and time.perf_counter() - started + job.cost > self.budget:
+                if metrics.enabled:
+                    metrics.count(f'tick.carried_over {job.name}')
+                continue
+            job_started = time.perf_counter()
+            try:
+                job.func()
+            except Exception as e:
+                log.exception(f"Tick job {job.name} failed {repr(e)}")
+            duration = time.perf_counter() - job_started
+            if metrics.enabled:
+                metrics.observe(f'tick.job {job.name}', duration)
+            job.cost += (duration - job.cost) * _COST_SMOOTHING
+            # stays on its staggered schedule, even after running late
+            job.next_due = self.tick_count + job.interval - (self.tick_count - job.offset) % job.interval
@@ -0,0 +1,32 @@
+import asyncio
+
+
+class SingleFlight(object):
+    """Deduplicates concurrent calls of an operation.
+    Callers arriving while the operation with the same key runs await it too and get its result or exception."""
+    def __init__(self):
+        self._in_flight = {}
+
+    def in_flight(self, key):
+        return key in self._in_flight
+
+    def cancel(self, key):
+        future = self._in_flight.get(key)
+        if future is not None:
+            future.cancel()
+
+    async def run(self, key, func, *args):
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func(*args))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._done(key, done))
+        # a cancelled caller must not cancel the operation others wait for
+        return await asyncio.shield(future)
+
+    def _done(self, key, future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.cancelled():
+            # retrieved so it isn't reported as never retrieved when every caller was cancelled
+            future.exception()
@@ -1,8 +1,8 @@
-import dateutil.parser
 import logging
 
 
 def _normalize_last_played(card):
+    import dateutil.parser
     iso_datetime = card.get('lastModified', None)
     if iso_datetime:
         dt = dateutil.parser.parse(iso_datetime)
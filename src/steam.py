@@ -1,43 +1,134 @@
 import os
+import re
+import threading
+import time
+import logging as log
+
 from definitions import GameStatus
-from consts import SYSTEM, System, STEAM_REGISTRY
-if SYSTEM == System.WINDOWS:
-    import winreg
+from consts import STEAM_REGISTRY, STEAM_REGISTRY_APPS, REGISTRY_CACHE_TTL
+from registry import registry, HKEY_CURRENT_USER
+
+# "key"  "value" pairs of Valve's KeyValues text format
+_VDF_PAIR = re.compile(r'"([^"]+)"\s+"((?:[^"\\]|\\.)*)"')
+
+# StateFlags bit set once all game files are downloaded
+_MANIFEST_FULLY_INSTALLED = 4
 
 
 def _get_steam_install_path():
     try:
-        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, STEAM_REGISTRY) as lkey:
-            steam_path, _ = winreg.QueryValueEx(lkey, 'SteamExe')
-            return os.path.normcase(os.path.normpath(steam_path))
+        steam_path = registry.get_value(HKEY_CURRENT_USER, STEAM_REGISTRY, 'SteamExe')
+        return os.path.normcase(os.path.normpath(steam_path))
     except OSError:
         return None
 
 
 def is_steam_installed():
-    if _get_steam_install_path():
-        return os.path.exists(_get_steam_install_path())
+    steam_path = _get_steam_install_path()
+    if steam_path:
+        return os.path.exists(steam_path)
     return False
 
 
+def _read_vdf_pairs(path):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return [(key, value.replace('\\\\', '\\')) for key, value in _VDF_PAIR.findall(f.read())]
+
+
+def _app_id_from_registry_path(path):
+    index = path.lower().find("software")
+    end = path.lower().find("installed")
+    return path[index:end].rstrip('\\').rsplit('\\', 1)[-1]
+
+
+class SteamStatusProvider(object):
+    """Resolves Steam game statuses from a single snapshot of all Steam\\Apps registry keys per status cycle.
+    Games missing from the registry are looked up in appmanifest files of the Steam libraries,
+    which are reparsed only when their modification time changes."""
+    def __init__(self):
+        self._manifests = {}
+        self._manifest_statuses = {}
+        self._manifests_scanned_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _status_from_registry(values):
+        if not int(values.get("Installed", 0)):
+            return GameStatus.NotInstalled
+        if int(values.get("Running", 0)):
+            return GameStatus.Running
+        # todo, 'Updating' status not yet supported
+        return GameStatus.Installed
+
+    def _get_library_paths(self):
+        try:
+            steam_path = registry.get_value(HKEY_CURRENT_USER, STEAM_REGISTRY, 'SteamPath')
+        except OSError:
+            return []
+        libraries = [os.path.normpath(steam_path)]
+        try:
+            for key, value in _read_vdf_pairs(os.path.join(steam_path, 'steamapps', 'libraryfolders.vdf')):
+                if key == 'path' or (key.isdigit() and os.path.isdir(value)):
+                    library = os.path.normpath(value)
+                    if library not in libraries:
+                        libraries.append(library)
+        except OSError:
+            pass
+        return libraries
+
+    @staticmethod
+    def _parse_manifest(path):
+        values = {}
+        for key, value in _read_vdf_pairs(path):
+            values.setdefault(key, value)
+        try:
+            installed = int(values.get('StateFlags', 0)) & _MANIFEST_FULLY_INSTALLED
+        except ValueError:
+            installed = False
+        return values.get('appid'), GameStatus.Installed if installed else GameStatus.NotInstalled
+
+    def _scan_manifests(self):
+        now = time.monotonic()
+        if self._manifests_scanned_at is not None and now - self._manifests_scanned_at < REGISTRY_CACHE_TTL:
+            return
+        self._manifests_scanned_at = now
+
+        seen = set()
+        for library in self._get_library_paths():
+            try:
+                with os.scandir(os.path.join(library, 'steamapps')) as entries:
+                    for entry in entries:
+                        if not entry.name.startswith('appmanifest_') or not entry.name.endswith('.acf'):
+                            continue
+                        seen.add(entry.path)
+                        try:
+                            mtime = entry.stat().st_mtime
+                            cached = self._manifests.get(entry.path)
+                            if cached is None or cached[0] != mtime:
+                                self._manifests[entry.path] = (mtime,) + self._parse_manifest(entry.path)
+                        except OSError as e:
+                            log.debug(f"Unable to read steam manifest {entry.path}: {repr(e)}")
+            except OSError:
+                continue
+
+        for path in set(self._manifests) - seen:
+            del self._manifests[path]
+        self._manifest_statuses = {app_id: status for _, app_id, status in self._manifests.values() if app_id}
+
+    def get_status(self, app_id):
+        try:
+            apps = registry.get_subkeys(HKEY_CURRENT_USER, STEAM_REGISTRY_APPS)
+        except OSError:
+            apps = {}
+        if app_id in apps:
+            return self._status_from_registry(apps[app_id])
+        with self._lock:
+            self._scan_manifests()
+            return self._manifest_statuses.get(app_id, GameStatus.NotInstalled)
+
+
+steam_status_provider = SteamStatusProvider()
+
+
 def get_steam_game_status(path):
-    reg_path = path
-    index = reg_path.lower().find("software")
-    end = reg_path.lower().find("installed")
-    try:
-        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, reg_path[index:end], 0, winreg.KEY_READ) as key:
-            if int(winreg.QueryValueEx(key, "Installed")[0]):
-                try:
-                    if int(winreg.QueryValueEx(key, "Running")[0]):
-                        return GameStatus.Running
-                    elif int(winreg.QueryValueEx(key, "Updating")[0]):
-                        # todo, 'Updating' status not yet supported
-                        return GameStatus.Installed
-                    else:
-                        return GameStatus.Installed
-                except WindowsError:
-                    return GameStatus.Installed
-            else:
-                return GameStatus.NotInstalled
-    except WindowsError:
-        return GameStatus.NotInstalled
+    return steam_status_provider.get_status(_app_id_from_registry_path(path))
@@ -0,0 +1,33 @@
+import json
+import logging as log
+import os
+
+from consts import PLUGIN_DATA_PATH
+
+
+def _snapshot_path(name):
+    return os.path.join(PLUGIN_DATA_PATH, f"{name}.json")
+
+
+def load_snapshot(name):
+    path = _snapshot_path(name)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning(f"Unable to load snapshot {path}: {repr(e)}")
+        return None
+
+
+def save_snapshot(name, data):
+    path = _snapshot_path(name)
+    try:
+        os.makedirs(PLUGIN_DATA_PATH, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        log.warning(f"Unable to save snapshot {path}: {repr(e)}")
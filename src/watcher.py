@@ -0,0 +1,317 @@
+import ctypes
+import ctypes.util
+import logging as log
+import os
+import select
+import struct
+import time
+from threading import Thread, Lock
+
+from definitions import SYSTEM, System
+from consts import WATCH_INSTALL_DIRECTORIES, WATCH_INSTALL_DIRECTORIES_WINDOWS
+
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_IGNORED = 0x00008000
+
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+_FILE_LIST_DIRECTORY = 0x0001
+_FILE_SHARE_ALL = 0x00000001 | 0x00000002 | 0x00000004
+_OPEN_EXISTING = 3
+_FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+_FILE_FLAG_OVERLAPPED = 0x40000000
+_FILE_NOTIFY_CHANGE_FILE_NAME = 0x00000001
+_FILE_NOTIFY_CHANGE_DIR_NAME = 0x00000002
+_FILE_NOTIFY_CHANGE_ATTRIBUTES = 0x00000004
+_FILE_NOTIFY_CHANGE_SIZE = 0x00000008
+_FILE_NOTIFY_CHANGE_LAST_WRITE = 0x00000010
+_FILE_NOTIFY_CHANGE_CREATION = 0x00000040
+_INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+
+_FILE_NOTIFY_INFORMATION = struct.Struct('III')
+_CHANGES_BUFFER_SIZE = 64 * 1024
+
+
+class _Overlapped(ctypes.Structure):
+    _fields_ = [
+        ('Internal', ctypes.c_size_t),
+        ('InternalHigh', ctypes.c_size_t),
+        ('Offset', ctypes.c_ulong),
+        ('OffsetHigh', ctypes.c_ulong),
+        ('hEvent', ctypes.c_void_p),
+    ]
+
+
+class WatcherBackend(object):
+    """Reports changes inside watched directories, below them too for subtree watches
+    of backends which support them"""
+    watches_subtrees = False
+
+    def add_watch(self, path, subtree=False):
+        raise NotImplementedError()
+
+    def remove_watch(self, path):
+        raise NotImplementedError()
+
+    def read_events(self, timeout):
+        """Blocks up to timeout seconds, returns paths which have changed and watched paths
+        which are no longer watched because they were deleted or moved"""
+        raise NotImplementedError()
+
+
+class InotifyBackend(WatcherBackend):
+    _MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE \
+        | _IN_DELETE_SELF | _IN_MOVE_SELF
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        # watches are changed by sync on the status thread while events are read on the watcher thread
+        self._lock = Lock()
+        self._paths = {}
+        self._descriptors = {}
+
+    def add_watch(self, path, subtree=False):
+        with self._lock:
+            descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self._MASK)
+            if descriptor < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno), path)
+            self._paths[descriptor] = path
+            self._descriptors[path] = descriptor
+
+    def remove_watch(self, path):
+        with self._lock:
+            descriptor = self._descriptors.pop(path, None)
+            if descriptor is not None:
+                self._paths.pop(descriptor, None)
+                self._libc.inotify_rm_watch(self._fd, descriptor)
+
+    def read_events(self, timeout):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return [], []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return [], []
+
+        changed = []
+        ignored = []
+        offset = 0
+        with self._lock:
+            while offset + _INOTIFY_EVENT.size <= len(data):
+                descriptor, mask, _, name_length = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = data[offset:offset + name_length].rstrip(b'\0')
+                offset += name_length
+
+                path = self._paths.get(descriptor)
+                if path is None:
+                    continue
+                if mask & _IN_IGNORED:
+                    self._paths.pop(descriptor, None)
+                    self._descriptors.pop(path, None)
+                    ignored.append(path)
+                changed.append(os.path.join(path, os.fsdecode(name)) if name else path)
+        return changed, ignored
+
+
+class _DirectoryWatch(object):
+    def __init__(self, path, handle, subtree):
+        self.path = path
+        self.handle = handle
+        self.subtree = subtree
+        # both are written by the kernel until the read completes, even after the handle was closed
+        self.buffer = ctypes.create_string_buffer(_CHANGES_BUFFER_SIZE)
+        self.overlapped = _Overlapped()
+
+    def parse(self, size):
+        if not size:
+            # the buffer overflowed, anything in the directory may have changed
+            return [self.path]
+        data = self.buffer.raw[:size]
+        changed = []
+        offset = 0
+        while True:
+            next_offset, _, name_length = _FILE_NOTIFY_INFORMATION.unpack_from(data, offset)
+            start = offset + _FILE_NOTIFY_INFORMATION.size
+            changed.append(os.path.join(self.path, data[start:start + name_length].decode('utf-16-le')))
+            if not next_offset:
+                return changed
+            offset += next_offset
+
+
+class ReadDirectoryChangesBackend(WatcherBackend):
+    """Overlapped ReadDirectoryChangesW reads of every watched directory completing on one I/O completion port"""
+    watches_subtrees = True
+
+    _FILTER = _FILE_NOTIFY_CHANGE_FILE_NAME | _FILE_NOTIFY_CHANGE_DIR_NAME | _FILE_NOTIFY_CHANGE_ATTRIBUTES \
+        | _FILE_NOTIFY_CHANGE_SIZE | _FILE_NOTIFY_CHANGE_LAST_WRITE | _FILE_NOTIFY_CHANGE_CREATION
+
+    def __init__(self):
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        self._create_file = kernel32.CreateFileW
+        self._create_file.argtypes = [ctypes.c_wchar_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_void_p,
+                                      ctypes.c_ulong, ctypes.c_ulong, ctypes.c_void_p]
+        self._create_file.restype = ctypes.c_void_p
+        self._create_port = kernel32.CreateIoCompletionPort
+        self._create_port.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_ulong]
+        self._create_port.restype = ctypes.c_void_p
+        self._read_changes = kernel32.ReadDirectoryChangesW
+        self._read_changes.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int,
+                                       ctypes.c_ulong, ctypes.c_void_p, ctypes.POINTER(_Overlapped), ctypes.c_void_p]
+        self._read_changes.restype = ctypes.c_int
+        self._get_completion = kernel32.GetQueuedCompletionStatus
+        self._get_completion.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_ulong),
+                                         ctypes.POINTER(ctypes.c_size_t), ctypes.POINTER(ctypes.c_void_p),
+                                         ctypes.c_ulong]
+        self._get_completion.restype = ctypes.c_int
+        self._close_handle = kernel32.CloseHandle
+        self._close_handle.argtypes = [ctypes.c_void_p]
+        self._close_handle.restype = ctypes.c_int
+
+        self._port = self._create_port(_INVALID_HANDLE_VALUE, None, 0, 1)
+        if not self._port:
+            raise ctypes.WinError(ctypes.get_last_error())
+        self._lock = Lock()
+        self._next_key = 0
+        self._watches = {}
+        self._keys = {}
+        # removed watches whose cancelled read has not completed yet
+        self._closing = {}
+
+    def _read(self, watch):
+        return self._read_changes(watch.handle, watch.buffer, _CHANGES_BUFFER_SIZE, watch.subtree, self._FILTER, None,
+                                  ctypes.byref(watch.overlapped), None)
+
+    def _close(self, key):
+        watch = self._watches.pop(key)
+        del self._keys[watch.path]
+        self._close_handle(watch.handle)
+        return watch
+
+    def add_watch(self, path, subtree=False):
+        with self._lock:
+            if path in self._keys:
+                self._closing[self._keys[path]] = self._close(self._keys[path])
+            handle = self._create_file(path, _FILE_LIST_DIRECTORY, _FILE_SHARE_ALL, None, _OPEN_EXISTING,
+                                       _FILE_FLAG_BACKUP_SEMANTICS | _FILE_FLAG_OVERLAPPED, None)
+            if handle in (None, _INVALID_HANDLE_VALUE):
+                raise ctypes.WinError(ctypes.get_last_error())
+            self._next_key += 1
+            key = self._next_key
+            watch = _DirectoryWatch(path, handle, subtree)
+            if not self._create_port(handle, self._port, key, 0) or not self._read(watch):
+                error = ctypes.WinError(ctypes.get_last_error())
+                self._close_handle(handle)
+                raise error
+            self._watches[key] = watch
+            self._keys[path] = key
+
+    def remove_watch(self, path):
+        with self._lock:
+            key = self._keys.get(path)
+            if key is not None:
+                # closing the handle cancels the pending read, its completion still arrives on the port
+                self._closing[key] = self._close(key)
+
+    def read_events(self, timeout):
+        transferred = ctypes.c_ulong()
+        key = ctypes.c_size_t()
+        overlapped = ctypes.c_void_p()
+        completed = self._get_completion(self._port, ctypes.byref(transferred), ctypes.byref(key),
+                                         ctypes.byref(overlapped), int(timeout * 1000))
+        if not overlapped.value:
+            return [], []  # timed out
+        with self._lock:
+            if self._closing.pop(key.value, None) is not None:
+                return [], []
+            watch = self._watches.get(key.value)
+            if watch is None:
+                return [], []
+            if not completed:
+                # the directory was deleted or the handle became unusable
+                self._close(key.value)
+                return [watch.path], [watch.path]
+            changed = watch.parse(transferred.value)
+            if not self._read(watch):
+                self._close(key.value)
+                return changed + [watch.path], [watch.path]
+            return changed, []
+
+
+class InstallWatcher(object):
+    """Watches game install directories and the launcher cache tree and reports changes as they happen.
+    Polling of game statuses stays in place, the watcher only lets it react sooner and run less often."""
+    def __init__(self, backend, on_change):
+        self._backend = backend
+        self._on_change = on_change
+        # watched path -> whether everything below it is watched too
+        self._watched = {}
+        self._lock = Lock()
+        Thread(target=self._run, daemon=True).start()
+
+    @property
+    def watches_subtrees(self):
+        return self._backend.watches_subtrees
+
+    def sync(self, paths, trees=()):
+        """Watches exactly the given directories and, if watches_subtrees, directory trees.
+        Missing ones and ones which stopped being watched are retried on next sync"""
+        wanted = {path: False for path in paths if path}
+        wanted.update((tree, True) for tree in trees if tree)
+        with self._lock:
+            for path, subtree in list(self._watched.items()):
+                if wanted.get(path) != subtree:
+                    self._backend.remove_watch(path)
+                    del self._watched[path]
+            for path, subtree in wanted.items():
+                if path in self._watched:
+                    continue
+                try:
+                    self._backend.add_watch(path, subtree)
+                    self._watched[path] = subtree
+                except OSError:
+                    pass  # not created yet
+
+    def _run(self):
+        while True:
+            try:
+                changed, ignored = self._backend.read_events(timeout=1)
+                if ignored:
+                    with self._lock:
+                        for path in ignored:
+                            self._watched.pop(path, None)
+                if changed:
+                    self._on_change(changed)
+            except Exception as e:
+                log.error(f"Install watcher error {repr(e)}")
+                time.sleep(1)
+
+
+def create_install_watcher(on_change):
+    if not WATCH_INSTALL_DIRECTORIES:
+        return None
+    backends = {System.LINUX: InotifyBackend}
+    if WATCH_INSTALL_DIRECTORIES_WINDOWS:
+        backends[System.WINDOWS] = ReadDirectoryChangesBackend
+    if SYSTEM not in backends:
+        # no native backend for this system, status polling only
+        return None
+    try:
+        return InstallWatcher(backends[SYSTEM](), on_change)
+    except Exception as e:
+        log.warning(f"Unable to start install watcher, falling back to polling: {repr(e)}")
+        return None